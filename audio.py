@@ -0,0 +1,302 @@
+import collections
+import io
+import platform
+import queue
+import shutil
+import struct
+import subprocess
+import threading
+import time
+import wave
+import utils
+
+
+class Sound:
+    # A sound decoded once into memory: raw PCM frames plus the parameters needed to play them
+
+    def __init__(self, path, channels, sampwidth, framerate, frames):
+        self.path = path
+        self.channels = channels
+        self.sampwidth = sampwidth
+        self.framerate = framerate
+        self.frames = frames
+        self.wav_bytes = None
+
+    @property
+    def nbytes(self):
+        return len(self.frames)
+
+    @property
+    def duration(self):
+        return len(self.frames) / float(self.channels * self.sampwidth * self.framerate)
+
+    def as_wav(self):
+        # Whole file image, for backends that only take complete WAV data (e.g. winsound)
+        if self.wav_bytes is None:
+            buffer = io.BytesIO()
+            with wave.open(buffer, "wb") as out:
+                out.setnchannels(self.channels)
+                out.setsampwidth(self.sampwidth)
+                out.setframerate(self.framerate)
+                out.writeframes(self.frames)
+            self.wav_bytes = buffer.getvalue()
+        return self.wav_bytes
+
+
+def decode(path):
+    # Reads the file from the resource bundle when it is packed there. The RIFF chunks are walked in place, so the
+    # frames of a bundled sound are a view of the mapping, not a copy (wave.open() would need a file object)
+    data = memoryview(utils.resource_data(path))
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise wave.Error("not a WAV file: %s" % path)
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk, size = struct.unpack_from("<4sI", data, pos)
+        body = data[pos + 8:pos + 8 + size]
+        if chunk == b"fmt ":
+            if len(body) < 16:
+                raise EOFError("truncated fmt chunk: %s" % path)
+            tag, channels, framerate, _, _, bits = struct.unpack_from("<HHIIHH", body)
+            if tag not in (1, 0xFFFE) or not channels or not bits:     # PCM, like the wave module
+                raise wave.Error("unsupported WAV format %d: %s" % (tag, path))
+            fmt = channels, (bits + 7) // 8, framerate
+        elif chunk == b"data":
+            if fmt is None:
+                raise wave.Error("data chunk before fmt chunk: %s" % path)
+            channels, sampwidth, framerate = fmt
+            return Sound(path, channels, sampwidth, framerate, body[:len(body) - len(body) % (channels * sampwidth)])
+        pos += 8 + size + (size & 1)
+    raise EOFError("no data chunk: %s" % path)
+
+
+class SoundCache:
+    # LRU cache of decoded sounds, bounded by the total size of their PCM buffers
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, loader=decode):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.sounds = collections.OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        with self.lock:
+            sound = self.sounds.get(path)
+            if sound is not None:
+                self.sounds.move_to_end(path)
+                self.hits += 1
+                return sound
+        sound = self.loader(path)
+        with self.lock:
+            self.misses += 1
+            if path not in self.sounds:
+                self.sounds[path] = sound
+                self.nbytes += sound.nbytes
+                # The sound just loaded is kept even if it alone exceeds the limit
+                while self.nbytes > self.max_bytes and len(self.sounds) > 1:
+                    _, old = self.sounds.popitem(last=False)
+                    self.nbytes -= old.nbytes
+        return sound
+
+    def clear(self):
+        with self.lock:
+            self.sounds.clear()
+            self.nbytes = 0
+
+
+class NullSink:
+    # Discards audio. With `realtime`, it takes as long as the sound would, so stop/snooze can be exercised
+
+    def __init__(self, realtime=False):
+        self.realtime = realtime
+        self.played = 0
+
+    def play(self, sound, interrupted):
+        self.played += 1
+        if self.realtime:
+            end = time.monotonic() + sound.duration
+            while not interrupted() and time.monotonic() < end:
+                time.sleep(0.02)
+
+
+class FileSink:
+    # Appends everything played to a WAV file (for machines without a sound card)
+
+    def __init__(self, path):
+        self.path = path
+        self.wav = None
+        self.played = 0
+
+    def play(self, sound, interrupted):
+        if self.wav is None:
+            self.wav = wave.open(self.path, "wb")
+            self.wav.setnchannels(sound.channels)
+            self.wav.setsampwidth(sound.sampwidth)
+            self.wav.setframerate(sound.framerate)
+        self.wav.writeframes(sound.frames)
+        self.played += 1
+
+    def close(self):
+        if self.wav is not None:
+            self.wav.close()
+            self.wav = None
+
+
+class AplaySink:
+    # Streams PCM to ALSA's aplay in small chunks, so playback can be cut short
+
+    chunk_time = 0.05
+
+    def __init__(self, command="aplay"):
+        self.command = command
+        self.played = 0
+
+    def play(self, sound, interrupted):
+        formats = {1: "U8", 2: "S16_LE", 3: "S24_3LE", 4: "S32_LE"}
+        proc = subprocess.Popen([self.command, "-q", "-t", "raw", "-f", formats[sound.sampwidth],
+                                 "-c", str(sound.channels), "-r", str(sound.framerate)],
+                                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.played += 1
+        chunk = max(int(sound.framerate * self.chunk_time), 1) * sound.channels * sound.sampwidth
+        frames = memoryview(sound.frames)
+        try:
+            for pos in range(0, len(frames), chunk):
+                if interrupted():
+                    proc.kill()
+                    break
+                proc.stdin.write(frames[pos:pos + chunk])
+            proc.stdin.close()
+            proc.wait()
+        except (BrokenPipeError, OSError):
+            proc.kill()
+
+
+class WinSoundSink:
+    # winsound can play a WAV image from memory, but only synchronously: stop takes effect after the current play
+
+    def __init__(self):
+        import winsound
+        self.winsound = winsound
+        self.played = 0
+
+    def play(self, sound, interrupted):
+        self.played += 1
+        self.winsound.PlaySound(sound.as_wav(), self.winsound.SND_MEMORY | self.winsound.SND_NODEFAULT)
+
+
+def default_sink():
+    if "Windows" in platform.system():
+        return WinSoundSink()
+    if shutil.which("aplay"):
+        return AplaySink()
+    return NullSink()
+
+
+class AudioPlayer:
+    # Plays decoded sounds from a single worker thread, without blocking the caller.
+    # A sound can repeat until acknowledged (stop()), and be snoozed: silenced now and resumed after a while.
+    # Any new command interrupts what is being played
+
+    shared = None
+
+    @classmethod
+    def get(cls):
+        # The player of the process, shared by all the clock windows so their sounds never overlap
+        if cls.shared is None:
+            cls.shared = cls()
+        return cls.shared
+
+    def __init__(self, sink=None, cache=None, repeat_interval=0.5):
+        self.sink = default_sink() if sink is None else sink
+        self.cache = SoundCache() if cache is None else cache
+        self.repeat_interval = repeat_interval
+        self.commands = queue.Queue()
+        self.playing = None
+        self.thread = threading.Thread(target=self.run, name="AudioPlayer", daemon=True)
+        self.thread.start()
+
+    def preload(self, *paths):
+        for path in paths:
+            try:
+                self.cache.get(path)
+            except (OSError, EOFError, wave.Error):
+                pass
+
+    def play(self, path, repeat=False):
+        self.commands.put(("play", path, repeat))
+
+    def stop(self):
+        self.commands.put(("stop",))
+
+    def snooze(self, seconds):
+        self.commands.put(("snooze", seconds))
+
+    def close(self, timeout=None):
+        if AudioPlayer.shared is self:
+            AudioPlayer.shared = None
+        self.commands.put(("quit",))
+        self.thread.join(timeout)
+
+    def interrupted(self):
+        return not self.commands.empty()
+
+    def run(self):
+        current = None      # (sound, repeat)
+        wake_at = None      # End of snooze
+        while True:
+            timeout = None if wake_at is None else max(wake_at - time.monotonic(), 0)
+            try:
+                command = self.commands.get(timeout=timeout)
+            except queue.Empty:
+                command = ("resume",)
+
+            kind = command[0]
+            if kind == "quit":
+                return
+            elif kind == "play":
+                try:
+                    current = (self.cache.get(command[1]), command[2])
+                except (OSError, EOFError, wave.Error):
+                    # Not a WAV file we can decode: let the old playsound path deal with it (it blocks, once)
+                    current = None
+                    try:
+                        utils.notify(None, command[1], None)
+                    except Exception:
+                        pass
+                wake_at = None
+            elif kind == "stop":
+                current = wake_at = None
+            elif kind == "snooze":
+                if current is not None:
+                    wake_at = time.monotonic() + command[1]
+                continue
+            elif kind == "resume":
+                wake_at = None
+
+            if current is not None and self.perform(*current):
+                current = None
+
+    def perform(self, sound, repeat):
+        # Returns True if the sound finished on its own (i.e. it was not interrupted by a command)
+        self.playing = sound.path
+        try:
+            while True:
+                try:
+                    self.sink.play(sound, self.interrupted)
+                except Exception:
+                    # No usable audio output: give up on this sound, but keep the worker alive
+                    return True
+                if self.interrupted():
+                    return False
+                if not repeat:
+                    return True
+                end = time.monotonic() + self.repeat_interval
+                while time.monotonic() < end:
+                    if self.interrupted():
+                        return False
+                    time.sleep(0.02)
+        finally:
+            self.playing = None
@@ -0,0 +1,992 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Headless benchmarks for the clock engine. None of them need a display.
+
+*** USAGE:
+python3 benchmarks.py               (run all benchmarks)
+python3 benchmarks.py drift ...     (run only the given ones)
+python3 benchmarks.py --record ...  (also save the results as the baseline the next runs are compared with)
+"""
+
+import json
+import model
+import os
+import random
+import subprocess
+import render
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import utils
+import wave
+import timekeeping
+
+
+class FakeClock:
+    # Manually advanced time source, to replay ticks that are late, merged or skipped
+
+    def __init__(self, start=1000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks_baseline.json")
+results = {}
+
+
+def report(name, value, unit):
+    results[name] = value
+    print("%-48s %14.3f %s" % (name, value, unit))
+
+
+def parse_display(text):
+    # Seconds shown by "HH:MM:SS" or "HH:MM:SS.f", and the display unit
+    hms, _, fraction = text.partition(".")
+    hours, minutes, seconds = (int(part) for part in hms.split(":"))
+    shown = hours * 3600 + minutes * 60 + seconds + (int(fraction) / 10 ** len(fraction) if fraction else 0)
+    return shown, 10 ** -len(fraction)
+
+
+def bench_drift(runs=200):
+    # 10-minute timers ticked late and merged (gaps of up to 3 s) and sometimes skipped for a while (up to 2 min,
+    # e.g. a suspend), without ever landing on the deadline on purpose. Every tick must show the time left to the
+    # true deadline (rounded up to the display unit), and the timer must fire once, on the first tick at or after it
+    rnd = random.Random(0)
+    ticks = 0
+    worst_display = 0.0
+    worst_fire = 0.0
+    for _ in range(runs):
+        clock = FakeClock()
+        fired = []
+        clock_model = model.ClockModel(notify=lambda message: fired.append(clock()), wall=clock, clock=clock)
+        duration = 600 + rnd.uniform(0, 1)
+        deadline = clock() + duration
+        clock_model.start_timer(0, duration)
+        while clock() < deadline:
+            clock.advance(rnd.uniform(5, 120) if rnd.random() < 0.01 else rnd.uniform(0, 3))
+            text = clock_model.tick()
+            ticks += 1
+            now = clock()
+            if now < deadline:
+                assert not fired, "fired %.3f s before the deadline" % (deadline - now)
+                shown, unit = parse_display(text)
+                error = shown - (deadline - now)
+                assert -1e-6 < error < unit + 1e-6, "showed %s with %.3f s left" % (text, deadline - now)
+                worst_display = max(worst_display, error)
+            else:
+                assert fired == [now], "did not fire on the first tick after the deadline"
+                worst_fire = max(worst_fire, now - deadline)
+        clock.advance(1)
+        clock_model.tick()
+        assert len(fired) == 1, "fired %d times" % len(fired)
+    report("countdown 10:00 with late and skipped ticks: ticks", ticks / runs, "ticks")
+    report("countdown: worst display lead over true remaining", worst_display * 1000, "ms")
+    report("countdown: worst firing delay (= the late tick)", worst_fire * 1000, "ms")
+
+    countdown = timekeeping.Countdown(FakeClock())
+
+    def tick():
+        countdown.remaining()
+        countdown.format()
+    countdown.start(hours=1, minutes=30)
+    report("countdown per-tick cost", min(timeit.repeat(tick, number=10000, repeat=5)) / 10000 * 1e6, "us")
+
+
+def bench_alarms():
+    # Per-tick cost must stay flat however many alarms are scheduled: a tick only peeks the heap head
+    rnd = random.Random(0)
+    now = 1000.0
+    for count in (1, 10, 100, 1000, 10000):
+        alarms = timekeeping.AlarmSchedule()
+        for i in range(count):
+            alarms.add("alarm%d" % i, now + 60 + rnd.uniform(0, 86400))
+        t = min(timeit.repeat(lambda: alarms.due(now), number=10000, repeat=5)) / 10000
+        report("alarm tick with %d alarms" % count, t * 1e6, "us")
+
+    # Alarms whose exact second was missed still fire on the next (late) tick
+    alarms = timekeeping.AlarmSchedule()
+    for i in range(100):
+        alarms.add("alarm%d" % i, now + i)
+    report("alarms fired by one tick 100 s late", len(alarms.due(now + 100)), "alarms")
+
+
+def bench_wakeups():
+    # Timer-driven ticks per minute, as reported by TickStats: once a second while shown, and only at the next
+    # deadline (or the watchdog interval) while hidden. Replays the delays Clock schedules, on a fake clock
+    import stats
+
+    def run(hidden, minutes, setup):
+        clock = FakeClock()
+        clock_model = model.ClockModel(wall=clock, clock=clock)
+        tick_stats = stats.TickStats()
+        tick_stats.wakeups = timekeeping.WakeupCounter(clock)
+        setup(clock_model)
+        end = clock() + minutes * 60
+        while clock() < end:
+            delay = clock_model.next_idle_delay() if hidden else clock_model.next_tick_delay()
+            if delay is None:
+                break       # Nothing pending: no timer is armed at all
+            clock.advance(max(delay, 0.001))
+            tick_stats.wakeups.add()
+            clock_model.tick()
+        clock.now = end
+        return tick_stats.summary()["wakeups"]["per_minute"]
+
+    shown = run(False, 5, lambda clock_model: None)
+    report("wakeups: shown, per minute", shown, "wakeups")
+    idle = run(True, 30, lambda clock_model: clock_model.schedule_alarm("later", clock_model.wall() + 7200))
+    report("wakeups: hidden, alarm in 2 h, per minute", idle, "wakeups")
+    quiet = run(True, 30, lambda clock_model: None)
+    report("wakeups: hidden, nothing pending, per minute", quiet, "wakeups")
+    assert 59 <= shown <= 61 and idle <= 1 and quiet == 0
+
+
+class FakeWidget:
+    # Stands in for a Tk widget, counting the calls that would be Tcl round trips
+
+    def __init__(self):
+        self.calls = 0
+        self.gridded = False
+
+    def configure(self, **kwargs):
+        self.calls += 1
+
+    def grid(self, **kwargs):
+        self.calls += 1
+        self.gridded = True
+
+    def grid_remove(self):
+        self.calls += 1
+        self.gridded = False
+
+    def grid_info(self):
+        self.calls += 1
+        return {"row": 0} if self.gridded else {}
+
+
+class FakeTooltip:
+    text = ""
+
+
+def bench_render(windows=20, ticks=3600):
+    # Tcl calls issued by one hour of ticks on many windows: the original draw_clock sequence vs. the diff layer
+    naive = 0
+    for _ in range(windows):
+        label, image = FakeWidget(), FakeWidget()
+        for tick in range(ticks):
+            label.configure(text=str(tick))
+            if not label.grid_info():
+                label.grid(row=0, column=0)
+            if image.grid_info():
+                image.grid_remove()
+        naive += label.calls + image.calls
+
+    TclCallCounter = render.TclCallCounter
+    TclCallCounter.all_windows = TclCallCounter(aggregate=False)
+    for _ in range(windows):
+        counter = TclCallCounter()
+        label = render.WidgetView(FakeWidget(), counter, row=0, column=0)
+        image = render.WidgetView(FakeWidget(), counter, FakeTooltip(), row=0, column=1)
+        for tick in range(ticks):
+            label.set_text(str(tick))
+            label.show()
+            image.show(False)
+            counter.end_tick()
+    diffed = TclCallCounter.all_windows.total
+    report("Tcl calls, %d windows x %d ticks, original" % (windows, ticks), naive, "calls")
+    report("Tcl calls, %d windows x %d ticks, diffed" % (windows, ticks), diffed, "calls")
+    report("Tcl calls per window per tick, diffed", diffed / windows / ticks, "calls")
+
+
+def write_wav(path, seconds=1.0, framerate=44100):
+    with wave.open(path, "wb") as out:
+        out.setnchannels(2)
+        out.setsampwidth(2)
+        out.setframerate(framerate)
+        out.writeframes(bytes(int(seconds * framerate) * 4))
+
+
+class TimingSink:
+    # Null audio output that records when each play actually starts
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.start_time = None
+
+    def play(self, sound, interrupted):
+        self.start_time = time.perf_counter()
+        self.started.set()
+
+
+def bench_audio(plays=50):
+    import audio
+
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, "beep.wav")
+    write_wav(path)
+
+    # Original path: the file is opened and decoded again on every play
+    def reopen():
+        with wave.open(path, "rb") as wav:
+            wav.readframes(wav.getnframes())
+    t = min(timeit.repeat(reopen, number=plays, repeat=3)) / plays
+    report("decode-per-play latency (original path)", t * 1000, "ms")
+
+    sink = TimingSink()
+    player = audio.AudioPlayer(sink)
+    latencies = []
+    for _ in range(plays):
+        sink.started.clear()
+        start = time.perf_counter()
+        player.play(path)
+        sink.started.wait()
+        latencies.append(sink.start_time - start)
+    player.close()
+    report("first play latency (decode + cache)", latencies[0] * 1000, "ms")
+    latencies = sorted(latencies[1:])
+    report("repeat play latency, median (cached PCM)", latencies[len(latencies) // 2] * 1000, "ms")
+    os.remove(path)
+    os.rmdir(folder)
+
+
+def cache_env(folder, **extra):
+    # Environment for a clock run by a benchmark: its caches (fonts, window position, journal, history) go to
+    # `folder`, never to the user's
+    return dict(os.environ, XDG_CACHE_HOME=folder, LOCALAPPDATA=folder, **extra)
+
+
+STARTUP_SCRIPT = """
+import json, os, sys, time
+start = time.perf_counter()
+import clock
+imported = time.perf_counter()
+result = {"import": imported - start, "modules": len(sys.modules)}
+try:
+    import tkutils
+    tkutils.FakeRoot.set_icon = lambda self, icon: None     # Before the root queues it
+    root = tkutils.FakeRoot("Clock by alef", "")
+    # Its constructor ends with the first draw_clock(). The cache folder is a temporary one (see cache_env())
+    clock.Clock(root, schedule_folder=os.path.join(os.environ["XDG_CACHE_HOME"], "schedule"))
+    root.update_idletasks()
+    result["first_paint"] = time.perf_counter() - start
+except Exception as exc:
+    result["error"] = str(exc).splitlines()[0]
+print(json.dumps(result))
+"""
+
+
+def bench_startup(runs=10):
+    # Runs in fresh interpreters, so nothing is already imported. First paint needs a display
+    samples = []
+    with tempfile.TemporaryDirectory() as folder:
+        for _ in range(runs):     # The font cache is cold in the first run only, as for a user
+            out = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], capture_output=True, text=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)), env=cache_env(folder))
+            samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    imports = sorted(sample["import"] for sample in samples)
+    report("startup: import clock, median", imports[len(imports) // 2] * 1000, "ms")
+    report("startup: modules loaded after import", samples[0]["modules"], "modules")
+    paints = sorted(sample["first_paint"] for sample in samples if "first_paint" in sample)
+    if paints:
+        report("startup: time to first draw_clock, median", paints[len(paints) // 2] * 1000, "ms")
+    else:
+        print("startup: time to first draw_clock skipped (%s)" % samples[0].get("error"))
+
+
+WINDOWS_SCRIPT = """
+import json, resource, sys
+def rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0    # MiB (ru_maxrss is KiB on Linux)
+import clock
+result = {"base": rss()}
+try:
+    import tkutils
+    tkutils.FakeRoot.set_icon = lambda self, icon: None
+    root = tkutils.FakeRoot("Clock by alef", "")
+    clock.Clock(root, persist=False)
+    root.update_idletasks()
+    result["first"] = rss()
+    for _ in range(%d):
+        clock.Clock(root, persist=False)
+        root.update_idletasks()
+    result["windows"] = rss()
+except Exception as exc:
+    result["error"] = str(exc).splitlines()[0]
+    # Without a display, only the Tk-free part of a window is measured: a model each, and the audio and notification
+    # threads that the windows of a process share
+    import audio, model, notifier
+    player = audio.AudioPlayer.shared = audio.AudioPlayer(sink=audio.NullSink())
+    notifier.Notifier.get("", "", show=lambda *a: None, play=player.play)
+    first = rss()
+    keep = [model.ClockModel() for _ in range(%d)]
+    result["first"] = first
+    result["windows"] = rss()
+import threading
+result["threads"] = sum(thread.name in ("AudioPlayer", "Notifier") for thread in threading.enumerate())
+print(json.dumps(result))
+"""
+
+
+def bench_instance(windows=5, runs=5):
+    # Single-instance mode: a later launch only forwards its options to the running process, which opens one
+    # more Toplevel. Compares its latency with a full startup, and the memory of N windows in one process vs N
+    with tempfile.TemporaryDirectory() as folder:
+        run_instance(folder, windows, runs)
+
+
+def run_instance(folder, windows, runs):
+    import control
+    env = cache_env(folder, XDG_RUNTIME_DIR=folder)
+    saved = os.environ.get("XDG_RUNTIME_DIR")
+    os.environ["XDG_RUNTIME_DIR"] = folder
+    try:
+        address = control.instance_address()
+    finally:
+        if saved is None:
+            del os.environ["XDG_RUNTIME_DIR"]
+        else:
+            os.environ["XDG_RUNTIME_DIR"] = saved
+    if isinstance(address, int):
+        print("instance: skipped (no UNIX sockets)")
+        return
+    # Stands in for the running clock: answers like clock.open_windows() without drawing anything
+    opened = []
+    server = control.CommandServer(lambda commands: [opened.append(c) or {"ok": True} for c in commands], address)
+    stop = threading.Event()
+    threading.Thread(target=server.serve, args=(stop,), daemon=True).start()
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def launch(args):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=here, env=env, capture_output=True, check=True)
+        return time.perf_counter() - start
+
+    second = sorted(launch(["clock.py", "--zones", "UTC"]) for _ in range(runs))
+    stop.set()
+    server.close()
+    assert len(opened) == runs, "every launch must be forwarded"
+    report("instance: second launch (forwarded), median", second[runs // 2] * 1000, "ms")
+    first = sorted(launch(["-c", STARTUP_SCRIPT]) for _ in range(runs))
+    painted = "first_paint" in json.loads(subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], cwd=here, env=env,
+                                                         capture_output=True, text=True).stdout.splitlines()[-1])
+    report("instance: new process, %s, median" % ("to first paint" if painted else "imports only (no display)"),
+           first[runs // 2] * 1000, "ms")
+
+    out = subprocess.run([sys.executable, "-c", WINDOWS_SCRIPT % (windows - 1, windows - 1)], cwd=here, env=env,
+                         capture_output=True, text=True)
+    sample = json.loads(out.stdout.strip().splitlines()[-1])
+    if "error" in sample:
+        print("instance: no display (%s), Tk windows not measured" % sample["error"])
+    assert sample["threads"] == 2, "the windows of a process must share one audio and one notification thread"
+    report("instance: RSS of one clock process", sample["first"], "MiB")
+    report("instance: RSS of %d windows, one process" % windows, sample["windows"], "MiB")
+
+    # N real processes of one window each, all running at the same time
+    procs = [subprocess.Popen([sys.executable, "-c", WINDOWS_SCRIPT % (0, 0)], cwd=here, env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) for _ in range(windows)]
+    total = sum(json.loads(proc.communicate()[0].strip().splitlines()[-1])["first"] for proc in procs)
+    report("instance: RSS of %d windows, %d processes (sum)" % (windows, windows), total, "MiB")
+
+
+def bench_tooltip(cycles=200):
+    # Hover cycles (show + hide) per second: a new Toplevel per hover (original) vs. the shared tooltip window
+    import tkinter as tk
+    import tkutils
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as exc:
+        print("tooltip: skipped (%s)" % str(exc).splitlines()[0])
+        return
+    widget = tk.Label(root, text="clock")
+    widget.pack()
+    root.update()
+
+    start = time.perf_counter()
+    for i in range(cycles):
+        tw = tk.Toplevel(widget)
+        tw.wm_overrideredirect(True)
+        frame = tk.Frame(tw, background="#303030")
+        label = tk.Label(frame, text="tooltip %d" % (i % 10), background="#303030", wraplength=300)
+        label.grid()
+        frame.grid()
+        label.winfo_reqwidth()
+        widget.winfo_screenwidth()
+        tw.wm_geometry("+10+10")
+        root.update_idletasks()
+        tw.destroy()
+        root.update_idletasks()
+    report("tooltip hover cycles, new window per hover", cycles / (time.perf_counter() - start), "cycles/s")
+
+    tooltips = [tkutils.Tooltip(widget, text="tooltip %d" % i) for i in range(10)]
+    start = time.perf_counter()
+    for i in range(cycles):
+        tooltip = tooltips[i % 10]
+        tooltip.show()
+        root.update_idletasks()
+        tooltip.hide()
+        root.update_idletasks()
+    report("tooltip hover cycles, shared window", cycles / (time.perf_counter() - start), "cycles/s")
+    root.destroy()
+
+
+def per_call(func, number=10000):
+    # Best-of-5 cost of one call, in microseconds
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def bench_model():
+    # The Tk-free clock core: cost per tick, per validated keystroke and per command
+    clock = model.ClockModel()
+    report("model tick, clock only", per_call(clock.tick), "us")
+    clock.start_timer(10, 0)
+    for i in range(1000):
+        clock.add_alarm(i % 24, i % 60, name="alarm%d" % i)
+    report("model tick, countdown + 1000 alarms", per_call(clock.tick), "us")
+    report("model next tick delay", per_call(clock.next_tick_delay), "us")
+
+    clock.begin_entry("timer")
+    values = ["", "0", "5", "59", "60", "99", "123", "x", " 7"]
+    report("keystroke validation (hour)", per_call(lambda: [clock.validate_hour(v) for v in values]) / len(values), "us")
+    report("keystroke validation (min/sec)",
+           per_call(lambda: [clock.validate_min_sec(v) for v in values]) / len(values), "us")
+    clock.cancel_entry()
+
+    def submit_alarm():
+        clock.on_key("a")
+        clock.submit_alarm("07", "30")
+    report("command: set alarm", per_call(submit_alarm), "us")
+
+    def submit_timer():
+        clock.on_key("t")
+        clock.submit_timer("10", "00")
+    report("command: start timer", per_call(submit_timer), "us")
+    report("command: stop", per_call(lambda: clock.on_key("s")), "us")
+
+
+def bench_zones():
+    # World clock tick cost as the number of zones grows (offsets are cached until the next DST transition)
+    import zoneinfo
+    names = sorted(name for name in zoneinfo.available_timezones() if "/" in name)
+    now = time.time()
+    for count in (1, 6, 12, 48, 192):
+        world = timekeeping.WorldClock(names[::max(len(names) // count, 1)][:count])
+        world.tick(now)     # Warm the offset caches
+        report("world clock tick with %d zones" % count, per_call(lambda: world.tick(now), 1000), "us")
+    report("world clock offset recomputations per zone", sum(z.recomputed for z in world.zones) / count, "times")
+
+
+def bench_control(count=2000):
+    # Commands per second through the control socket, one per request and in batches
+    import control
+
+    with tempfile.TemporaryDirectory() as folder:
+        clock = model.ClockModel()
+        address = os.path.join(folder, "control.sock") if hasattr(control.socket, "AF_UNIX") else 0
+        server = control.CommandServer(lambda commands: [control.run_command(clock, c) for c in commands], address)
+        if address == 0:
+            address = server.sock.getsockname()[1]
+        stop = threading.Event()
+        thread = threading.Thread(target=server.serve, args=(stop,), daemon=True)
+        thread.start()
+
+        start = time.perf_counter()
+        for i in range(count // 10):
+            control.send({"cmd": "set_alarm", "name": "single%d" % i, "at": 4e9 + i}, address)
+        report("control: single commands, one connection each", count // 10 / (time.perf_counter() - start), "cmd/s")
+
+        for size in (10, 100):
+            start = time.perf_counter()
+            for i in range(count // size):
+                batch = [{"cmd": "set_alarm", "name": "batch%d_%d" % (i, j), "at": 4e9 + j} for j in range(size)]
+                acks = control.send(batch, address)
+            report("control: batches of %d commands" % size, count / (time.perf_counter() - start), "cmd/s")
+        assert all(ack["ok"] for ack in acks)
+
+        stop.set()
+        thread.join()
+        server.close()
+
+
+def bench_journal(count=5000):
+    # Cost of recording a change on the caller's thread, and of restoring thousands of entries at startup
+    import journal
+    import shutil
+
+    folder = tempfile.mkdtemp()
+    clock = model.ClockModel(journal=journal.Journal(folder, compact_every=2000))
+    clock.journal.restore()
+    start = time.perf_counter()
+    for i in range(count):
+        clock.schedule_alarm("alarm%d" % i, 4e9 + i)
+    clock.start_timer(10, 0)
+    report("journal: record cost on the Tk thread", (time.perf_counter() - start) / count * 1e6, "us")
+    clock.journal.close()
+    report("journal: compactions", clock.journal.compactions, "times")
+
+    start = time.perf_counter()
+    restored = model.ClockModel(journal=journal.Journal(folder))
+    restored.restore(restored.journal.restore())
+    report("journal: restore %d alarms + timer" % len(restored.alarms), (time.perf_counter() - start) * 1000, "ms")
+    assert len(restored.alarms) == count and restored.timer_set
+    shutil.rmtree(folder)
+
+
+class FakeFont:
+    # Monospaced-ish font with per-character widths, standing in for a pygame font (only size() is used)
+
+    def size(self, text):
+        return sum(6 + (ord(ch) % 5) for ch in text), 12
+
+
+def wrap_text_original(text, font, width):
+    # utils.WrapText before it cached widths: re-measures the whole prefix for every candidate space
+    text_lines = text.replace('\t', '    ').split('\n')
+    if width is None or width == 0:
+        return text_lines
+    wrapped_lines = []
+    for line in text_lines:
+        line = line.rstrip() + ' '
+        if line == ' ':
+            wrapped_lines.append(line)
+            continue
+        start = len(line) - len(line.lstrip())
+        start = line.index(' ', start)
+        while start + 1 < len(line):
+            next = line.index(' ', start + 1)
+            if font.size(line[:next])[0] <= width:
+                start = next
+            else:
+                wrapped_lines.append(line[:start])
+                line = line[start + 1:]
+                start = line.index(' ')
+        line = line[:-1]
+        if line:
+            wrapped_lines.append(line)
+    return wrapped_lines
+
+
+def bench_wrap():
+    rnd = random.Random(0)
+    words = ["alarm", "timer", "countdown", "clock", "on-call", "handoff", "a", "the", "meeting", "reminder"]
+    text = "\n".join(" ".join(rnd.choice(words) for _ in range(rnd.randint(50, 800)))
+                     + rnd.choice(["", "  ", "\t"]) for _ in range(8))
+    report("wrap: text size", len(text) / 1024, "KiB")
+    for width in (120, 300, 800):
+        font = FakeFont()
+        assert wrap_text_original(text, font, width) == utils.WrapText(text, FakeFont(), width)
+        before = per_call(lambda: wrap_text_original(text, font, width), 5)
+        after = per_call(lambda: utils.WrapText(text, font, width), 5)
+        report("wrap %dpx: original" % width, before / 1000, "ms")
+        report("wrap %dpx: cached widths" % width, after / 1000, "ms")
+    texts = [text[i:i + 2000] for i in range(0, len(text), 500)]
+    font = FakeFont()
+    assert utils.WrapTexts(texts, font, 300) == [wrap_text_original(t, font, 300) for t in texts]
+    report("wrap: batch of %d texts" % len(texts), per_call(lambda: utils.WrapTexts(texts, font, 300), 5) / 1000, "ms")
+
+
+def bench_bundle(files=40, rounds=20):
+    # Startup resource loading: every loose file opened and read vs. one mmap'ed bundle sliced per resource
+    import bundle
+    import shutil
+
+    folder = tempfile.mkdtemp()
+    rnd = random.Random(0)
+    names = []
+    for i in range(files):
+        name = "resource%02d.%s" % (i, ("png", "ico", "wav", "ttf")[i % 4])
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(rnd.randbytes(rnd.randint(1000, 200000)))
+        names.append(name)
+    bundle_path = os.path.join(folder, bundle.BUNDLE_NAME)
+    bundle.build(folder, bundle_path)
+
+    def loose():
+        for name in names:
+            with open(os.path.join(folder, name), "rb") as f:
+                f.read()
+
+    def packed():
+        resources = bundle.Bundle(bundle_path)
+        for name in names:
+            resources.get(name)
+
+    with open(os.path.join(folder, names[-1]), "rb") as f:
+        assert bytes(bundle.Bundle(bundle_path).get(names[-1])) == f.read()
+    report("resources: %d loose files" % files, per_call(loose, rounds) / 1000, "ms")
+    report("resources: one mmap'ed bundle", per_call(packed, rounds) / 1000, "ms")
+    shutil.rmtree(folder)
+
+
+def bench_import(events=50000):
+    # Streaming import throughput, and the parser's memory ceiling (it must not grow with the file)
+    import importer
+    import shutil
+    import tracemalloc
+
+    folder = tempfile.mkdtemp()
+    ics_path = os.path.join(folder, "calendar.ics")
+    csv_path = os.path.join(folder, "alarms.csv")
+    with open(ics_path, "w") as ics, open(csv_path, "w") as f:
+        ics.write("BEGIN:VCALENDAR\r\n")
+        f.write("time,label\n")
+        for i in range(events):
+            moment = time.strftime("%Y%m%dT%H%M%S", time.gmtime(4e9 + i * 60))
+            ics.write("BEGIN:VEVENT\r\nUID:event%d\r\nSUMMARY:Meeting %d\r\nDTSTART:%sZ\r\n"
+                      "BEGIN:VALARM\r\nTRIGGER:-PT5M\r\nEND:VALARM\r\nEND:VEVENT\r\n" % (i, i, moment))
+            f.write("%s,Reminder %d\n" % (time.strftime("%Y-%m-%d %H:%M", time.localtime(4e9 + i * 60)), i)
+                    if i % 1000 else "not a time,broken row\n")
+        ics.write("END:VCALENDAR\r\n")
+
+    for path in (ics_path, csv_path):
+        kind = path.rsplit(".", 1)[1]
+        errors = []
+        start = time.perf_counter()
+        clock = model.ClockModel()
+        imported, _ = importer.import_alarms(clock, path, on_error=lambda line, message: errors.append(line))
+        elapsed = time.perf_counter() - start
+        report("import %s: events/s (%d imported, %d bad)" % (kind, imported, len(errors)), imported / elapsed, "ev/s")
+
+        tracemalloc.start()
+        for _ in importer.iter_events(path):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report("import %s: parser peak memory" % kind, peak / 1024, "KiB")
+        assert peak < 1024 * 1024, "the parser must stream in constant memory"
+    shutil.rmtree(folder)
+
+
+def bench_stopwatch(laps=100000):
+    # Lap cost and memory, the displayed millisecond text under irregular redraws, and CSV export
+    ticks = [0]
+    watch = timekeeping.Stopwatch(clock=lambda: ticks[0])
+    watch.start()
+    random.seed(19)
+    for _ in range(laps):
+        ticks[0] += random.randint(10 ** 6, 10 ** 9)
+        watch.lap()
+    report("stopwatch: lap buffer per lap", watch.laps.buffer_info()[1] * watch.laps.itemsize / laps, "bytes")
+    assert watch.total == sum(watch.laps) and watch.best == min(watch.laps) and watch.worst == max(watch.laps)
+
+    real = timekeeping.Stopwatch()
+    real.start()
+    report("stopwatch: lap", per_call(real.lap), "us")
+    report("stopwatch: format (ms)", per_call(real.format), "us")
+
+    # Redraws arrive late and unevenly, but every one shows the true elapsed time, so errors never add up
+    def shown_ns(text):
+        hours, minutes, seconds = text.split(":")
+        return int(round((int(hours) * 3600 + int(minutes) * 60 + float(seconds)) * 1000)) * 10 ** 6
+
+    watch.reset()
+    watch.start()
+    worst = 0
+    for _ in range(10000):
+        ticks[0] += int((1 / 30.0 + random.uniform(0, 0.02)) * 1e9)
+        shown = watch.format()
+        worst = max(worst, watch.elapsed_ns() - shown_ns(shown))
+    report("stopwatch: worst display error after 10000 late redraws", worst / 1e6, "ms")
+    assert worst < 10 ** 6
+
+    for _ in range(laps):
+        ticks[0] += 1234567
+        watch.lap()
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        watch.export_csv(os.path.join(folder, "laps.csv"))
+        report("stopwatch: CSV export of %d laps" % laps, (time.perf_counter() - start) * 1000, "ms")
+
+
+def bench_frames(seconds=60):
+    # Frame pacing under random callback lateness: a naive "after(period)" loop drifts by the sum of its delays,
+    # the pacer stays on its grid and skips what it missed. Also counts the ticks a whole-seconds display needs
+    random.seed(20)
+    for rate in timekeeping.FramePacer.RATES:
+        period = 1.0 / rate
+        lateness = [random.expovariate(1 / 0.004) + (0.25 if random.random() < 0.01 else 0)
+                    for _ in range(seconds * rate)]
+        naive = 0.0
+        for late in lateness:
+            naive += period + late
+        clock = FakeClock(0.0)
+        pacer = timekeeping.FramePacer(rate, clock=clock)
+        delay = pacer.frame()
+        worst = 0.0
+        for late in lateness:
+            clock.advance(delay + late)
+            delay = pacer.frame()
+            phase = (clock.now - pacer.origin) % period
+            worst = max(worst, min(phase, period - phase))
+        report("frames %d Hz: naive loop drift after %ds" % (rate, seconds), (naive - seconds) * 1000, "ms")
+        report("frames %d Hz: paced, worst offset from the grid" % rate, worst * 1000, "ms")
+        report("frames %d Hz: frames drawn / skipped" % rate, pacer.frames / max(pacer.skipped, 1), "ratio")
+        summary = pacer.summary()["interval"]
+        report("frames %d Hz: frame interval p50" % rate, summary["p50"] * 1000, "ms")
+        report("frames %d Hz: frame interval p99" % rate, summary["p99"] * 1000, "ms")
+
+    wall = FakeClock(1000.25)
+    clock = model.ClockModel(wall=wall, clock=wall)
+    ticks = 0
+    while wall.now < 1000.25 + seconds:
+        clock.tick()
+        wall.advance(clock.next_tick_delay())
+        ticks += 1
+    report("ticks for %ds of a whole-seconds display" % seconds, ticks, "ticks")
+    clock.stopwatch.start()
+    report("model tick, running stopwatch", per_call(clock.tick), "us")
+
+
+class FakeWindow:
+    # Just enough of a Toplevel for tkutils.MotionCoalescer, with after() driven by a FakeClock (milliseconds)
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.jobs = {}
+        self.geometry_calls = 0
+
+    def after(self, ms, callback):
+        job = object()
+        self.jobs[job] = (self.clock.now + ms, callback)
+        return job
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run_due(self):
+        for job, (due, callback) in list(self.jobs.items()):
+            if due <= self.clock.now and self.jobs.pop(job, None):
+                callback()
+
+    def geometry(self, spec):
+        self.geometry_calls += 1
+
+    def winfo_width(self):
+        return 300
+
+    def winfo_height(self):
+        return 80
+
+    def winfo_screenwidth(self):
+        return 1920
+
+    def winfo_screenheight(self):
+        return 1080
+
+
+def bench_drag(seconds=2, rates=(125, 500, 1000)):
+    # Geometry changes sent to the window manager while dragging, per mouse polling rate
+    import tkutils
+    for rate in rates:
+        clock = FakeClock(0.0)
+        window = FakeWindow(clock)
+        mover = tkutils.MotionCoalescer(window, snap=20)
+        for i in range(seconds * rate):
+            clock.now = i * 1000.0 / rate
+            window.run_due()
+            mover.motion(100 + i % 1800, 100 + (i * 3) % 1000)
+        mover.release()
+        report("drag %d Hz mouse: geometry calls/s, original" % rate, rate, "calls/s")
+        report("drag %d Hz mouse: geometry calls/s, coalesced" % rate, window.geometry_calls / seconds, "calls/s")
+        report("drag %d Hz mouse: events in per geometry call" % rate, mover.events / mover.moves, "events")
+
+    mover = tkutils.MotionCoalescer(FakeWindow(FakeClock(0.0)))
+    report("drag: cost per motion event", per_call(lambda: mover.motion(10, 10)), "us")
+
+
+def bench_watchdog():
+    # Suspend and wall-clock steps replayed on injected clocks: what each overdue policy notifies, whether steps
+    # are detected (and suspends are not mistaken for them), and what the check costs per tick
+    for policy in model.ClockModel.OVERDUE_POLICIES:
+        wall = FakeClock(1700000000.25)
+        uptime = FakeClock(5000.0)
+        notices = []
+        clock = model.ClockModel(notify=notices.append, wall=wall, clock=uptime, overdue_policy=policy)
+        for i in range(1, 721):
+            clock.schedule_alarm("a%d" % i, wall.now + i * 10)     # Every 10 s for two hours
+        clock.start_timer(30, 0)
+
+        def run(seconds):
+            for _ in range(seconds):
+                clock.tick()
+                delay = clock.next_tick_delay()
+                wall.advance(delay)
+                uptime.advance(delay)
+
+        run(600)
+        on_time = len(notices)
+        wall.advance(3600)          # Suspended for an hour: both clocks keep counting, no tick runs
+        uptime.advance(3600)
+        run(1)
+        after_suspend = len(notices) - on_time
+        assert not clock.timer_set, "the countdown must have finished during the suspend"
+        wall.advance(-1800.4)       # The wall clock is stepped back by half an hour...
+        run(1)
+        stepped = clock.jumped
+        assert abs(clock.next_tick_delay() - (1 - divmod(wall.now, 1)[1])) < 1e-9, "re-armed on the new second"
+        wall.advance(1800)          # ... and forward again
+        run(600)
+        report("watchdog %s: notices in the first 10 min" % policy, on_time, "notices")
+        report("watchdog %s: notices after a 1 h suspend" % policy, after_suspend, "notices")
+        report("watchdog %s: notices in total, with a 30 min step" % policy, len(notices), "notices")
+        assert stepped < -1800 and clock.watchdog.steps == 2, "both steps detected, the suspend is not a step"
+
+    clock = model.ClockModel()
+    report("watchdog: model tick with the check", per_call(clock.tick), "us")
+    report("watchdog: check alone", per_call(clock.watchdog.check), "us")
+
+
+def bench_recurrence(rules=2000):
+    # A year of occurrences for thousands of compiled rules, vs scanning minute by minute; then a model firing
+    # hundreds of recurring alarms
+    import recurrence
+
+    random.seed(24)
+    days = ["daily", "weekdays", "weekends", "mon,wed,fri", "tue-thu", "sat"]
+    texts = []
+    for i in range(rules):
+        if i % 2:
+            texts.append("%s %02d:%02d" % (random.choice(days), random.randrange(24), random.randrange(60)))
+        else:
+            texts.append("%d %s * %s %s" % (random.randrange(60), random.choice(["*/4", "9-17", "8,12,18", "6"]),
+                                            random.choice(["*", "1-6", "*/3"]), random.choice(["*", "1-5", "0"])))
+    start = time.perf_counter()
+    compiled = [recurrence.compile_rule(text) for text in texts]
+    report("recurrence: compile %d rules" % rules, (time.perf_counter() - start) * 1000, "ms")
+    recurrence.compile_rule.cache_clear()
+
+    year_start = time.mktime((2027, 1, 1, 0, 0, 0, 0, 0, -1))
+    year_end = time.mktime((2028, 1, 1, 0, 0, 0, 0, 0, -1))
+    start = time.perf_counter()
+    total = sum(sum(1 for _ in rule.occurrences(year_start, year_end)) for rule in compiled)
+    elapsed = time.perf_counter() - start
+    report("recurrence: a year of %d rules (%d occurrences)" % (rules, total), elapsed, "s")
+    report("recurrence: next occurrence", elapsed / total * 1e6, "us")
+
+    def minute_scan(rule, t):
+        # What a scheduler without compiled rules does: test every minute
+        t = (t // 60 + 1) * 60
+        while True:
+            local = time.localtime(t)
+            cron_weekday = (local.tm_wday + 1) % 7
+            if (rule.minutes >> local.tm_min & 1 and rule.hours >> local.tm_hour & 1 and rule.months >> local.tm_mon & 1
+                    and rule.day_mask(local.tm_year, local.tm_mon) >> local.tm_mday & 1):
+                return t
+            t += 60
+    rule = recurrence.compile_rule("weekdays 09:00")
+    assert minute_scan(rule, year_start) == rule.next_after(year_start)
+    report("recurrence: next weekday 09:00, minute scan", per_call(lambda: minute_scan(rule, year_start), 20), "us")
+    report("recurrence: next weekday 09:00, compiled", per_call(lambda: rule.next_after(year_start)), "us")
+
+    wall = FakeClock(year_start)
+    clock = model.ClockModel(wall=wall)
+    for i, text in enumerate(texts[:500]):
+        clock.add_recurring("rule%d" % i, text)
+    fired = []
+    clock.notify = fired.append
+    start = time.perf_counter()
+    for _ in range(7 * 24 * 60):        # One tick a minute for a week
+        wall.advance(60)
+        clock.tick()
+    report("recurrence: a week of 500 recurring alarms (%d fired)" % len(fired),
+           (time.perf_counter() - start) * 1000, "ms")
+
+
+def bench_history(records=2000000, capacity=1000000):
+    # Millions of fired-event records in the ring file: append rate, disk usage, and time range queries that
+    # only read what they return
+    import history
+    import shutil
+    import tracemalloc
+
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, "history.bin")
+    ring = history.History(path, capacity)
+    labels = ["standup", "lunch", "tea", "10:00", "shift change"]
+    start = time.perf_counter()
+    for i in range(records):
+        ring.record(history.KINDS[i % 4], labels[i % 5], 0.001 * (i % 50), 1.6e9 + i * 30)
+    elapsed = time.perf_counter() - start
+    ring.flush()
+    report("history: append %d records" % records, records / elapsed, "rec/s")
+    report("history: file size (capacity %d)" % capacity, os.path.getsize(path) / 1024 / 1024, "MiB")
+    report("history: record size", history.RECORD.size, "bytes")
+
+    newest = 1.6e9 + (records - 1) * 30
+    tracemalloc.start()
+    start = time.perf_counter()
+    hits = list(ring.query(newest - 86400, newest - 82800, ["alarm"]))     # One hour, a day ago
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report("history: query one hour of one kind (%d hits)" % len(hits), elapsed * 1000, "ms")
+    report("history: query peak memory", peak / 1024, "KiB")
+    assert len(hits) == 30 and ring.bisect(0) == 0 and all(hit[2] in labels for hit in hits)
+
+    reader = history.History(path, readonly=True)
+    report("history: open read-only and find a time", per_call(lambda: history.History(path, readonly=True).bisect(
+        newest - 3600), 100), "us")
+    reader.map.close()
+    ring.close()
+    shutil.rmtree(folder)
+
+
+BENCHMARKS = {
+    "drift": bench_drift,
+    "alarms": bench_alarms,
+    "wakeups": bench_wakeups,
+    "render": bench_render,
+    "audio": bench_audio,
+    "startup": bench_startup,
+    "tooltip": bench_tooltip,
+    "model": bench_model,
+    "zones": bench_zones,
+    "control": bench_control,
+    "journal": bench_journal,
+    "wrap": bench_wrap,
+    "bundle": bench_bundle,
+    "import": bench_import,
+    "stopwatch": bench_stopwatch,
+    "frames": bench_frames,
+    "instance": bench_instance,
+    "drag": bench_drag,
+    "watchdog": bench_watchdog,
+    "recurrence": bench_recurrence,
+    "history": bench_history,
+}
+
+
+def main(names=None, record=False):
+    for name in names or BENCHMARKS:
+        BENCHMARKS[name]()
+
+    if os.path.isfile(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+        compared = [name for name in results if baseline.get(name)]
+        if compared:
+            print("\nCompared with baseline:")
+            for name in compared:
+                print("%-48s %+13.1f %%" % (name, (results[name] / baseline[name] - 1) * 100))
+    if record:
+        baseline = {}
+        if os.path.isfile(BASELINE_FILE):
+            with open(BASELINE_FILE) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main([arg for arg in args if arg != "--record"], "--record" in args)
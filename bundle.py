@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Single-file resource bundle, read through mmap.
+
+Layout: MAGIC, index length (4 bytes, little endian), JSON index {name: [offset, size]}, then the files,
+each one starting at an 8-byte aligned offset from the beginning of the bundle.
+
+*** USAGE:
+python3 bundle.py resources/ resources.bundle       (build a bundle with every file in resources/)
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"CLKBNDL1"
+BUNDLE_NAME = "resources.bundle"
+
+
+def build(folder, path):
+    names = sorted(name for name in os.listdir(folder)
+                   if os.path.isfile(os.path.join(folder, name)) and name != BUNDLE_NAME)
+    sizes = [os.path.getsize(os.path.join(folder, name)) for name in names]
+
+    # The index size depends on the offsets it holds, so lay out the data until it is stable
+    data_start = 0
+    while True:
+        index = {}
+        offset = data_start
+        for name, size in zip(names, sizes):
+            index[name] = [offset, size]
+            offset = (offset + size + 7) & ~7
+        header = json.dumps(index, separators=(",", ":")).encode()
+        start = (len(MAGIC) + 4 + len(header) + 7) & ~7
+        if start == data_start:
+            break
+        data_start = start
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as out:
+        out.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for name in names:
+            out.write(b"\0" * (index[name][0] - out.tell()))
+            with open(os.path.join(folder, name), "rb") as f:
+                out.write(f.read())
+    os.replace(tmp, path)
+    return index
+
+
+class Bundle:
+    # Read-only view of a bundle. get() returns zero-copy memoryview slices of the mapped file
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.map.close()
+            raise ValueError("not a resource bundle: %s" % path)
+        start = len(MAGIC) + 4
+        (length,) = struct.unpack("<I", self.map[len(MAGIC):start])
+        self.index = json.loads(self.map[start:start + length])
+        self.view = memoryview(self.map)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def names(self):
+        return list(self.index)
+
+    def get(self, name):
+        offset, size = self.index[name]
+        return self.view[offset:offset + size]
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        return 1
+    index = build(sys.argv[1], sys.argv[2])
+    print("%d resources bundled into %s" % (len(index), sys.argv[2]))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,67 +14,104 @@ Feel free to use it, modify it, distribute it or whatever... just be sure to men
 QUIT PROGRAM:       Escape
 SET ALARM:          a / A (hh:mm)
 SET TIMER:          t / T (mm:ss)
+STOPWATCH:          w / W (start / pause), l / L (lap), s / S (reset, while shown)
 STOP ALARM/TIMER:   s / S
 MOVE WINDOW:        Mouse Button-1
 MINIMIZE:           Mouse Button-2
 """
 
+import audio
+import model
+import os
 import platform
-import pywinctl
+import render
+import stats
 import time
 import tkinter as tk
-import threading
+import timekeeping
 import tkutils as tt
 import utils
 
 
 class Clock(tk.Toplevel):
 
-    def __init__(self, master, *args, **kwargs):
+    instances = []      # Open clock windows of this process (more than one in single-instance mode)
+
+    def __init__(self, master, *args, zones=None, schedule_folder=None, frame_rate=30, persist=True, snap=0,
+                 overdue_policy="fire", **kwargs):
         tk.Toplevel.__init__(self, master, *args, **kwargs)
         self.master = master
+        Clock.instances.append(self)
 
         # General variables
         self.archOS = platform.system()
         self.callback_job = None
         self.gathering_values = False
         self.decorated = False
-        self.clock_mode = True
-        self.alarm_set = False
-        self.timer_set = False
+        self.hidden = False
+        self.wakeups = timekeeping.WakeupCounter()
+        self.max_idle_delay = 600     # Seconds. Upper bound for a single wait while hidden
+        self.watchdog_interval = 60   # Seconds. Same, while wall-clock alarms are pending (the wall clock may step)
+        self.tick_due = None            # Monotonic time the pending tick was scheduled for
+        self.tick_stats = stats.TickStats()
+        self.pacer = timekeeping.FramePacer(frame_rate)     # Paces redraws while fractions of a second are shown
+        self.tick_stats.pacer = self.pacer
+        self.tick_stats.wakeups = self.wakeups
+        self.stats_exporter = None      # stats.StatsExporter, if enabled (see start_services())
+        self.stats_interval = 10000     # Milliseconds between stats exports
+        self.control = None             # control.CommandServer, if scripts may send commands
 
         self.bg_color = "gray19"
         self.font = "Helvetica"
         self.resources_folder = utils.resource_path("resources/")
-        if utils.load_font(self.archOS, self.resources_folder + "DigitalDismay.otf", False, True):
+        if schedule_folder is None:
+            schedule_folder = os.path.join(utils.user_cache_dir(), "schedule")
+        if "Windows" not in self.archOS:
+            # Validates all bundled fonts in one pass (and one cache write), so the calls below are cache hits
+            utils.preload_fonts([self.resources_folder + font for font in
+                                 ("DigitalDismay.otf", "freesans.ttf", "freesans-bold.ttf")])
+        self.font_path = self.resources_folder + "DigitalDismay.otf"
+        if utils.load_font(self.archOS, self.font_path, False, True):
             self.font = "Digital Dismay"
+        self.use_glyphs = True          # Draw the time with pre-rendered glyph images, if the font file can be loaded
         self.font_size = int(40 * (self.winfo_screenheight() / 1080))
         self.font_color = "white"
         self.tooltip = "Click on clock to enter a command:\n" \
                        "QUIT:\tEscape\n" \
                        "ALARM:\ta (hh:mm)\n" \
                        "TIMER:\tt (mm:ss)\n" \
-                       "STOP:\ts (alarm / timer)\n" \
+                       "WATCH:\tw (start / pause), l (lap)\n" \
+                       "STOP:\ts (watch if shown, else alarm / timer)\n" \
                        "MOVE:\tMouse Button-1\n" \
                        "TRAY:\tMouse Button-2"
-        self.init_minutes = 10
-        self.init_seconds = 0
-        self.minutes = 10
-        self.seconds = 0
+        self.schedule_folder = schedule_folder
+        self.model = model.ClockModel(notify=self.beep, overdue_policy=overdue_policy)
+        self.model.frame_rate = frame_rate
         self.time_label = None
-        self.hh_alarm = ""
-        self.mm_alarm = ""
+        self.alarms_version = -1
         self.callback_job = None
         self.beep_sound = self.resources_folder + "beep.wav"
+        self.player = None              # audio.AudioPlayer and notifier.Notifier, see start_notifier()
+        self.notifier = None
         self.mouse_X_pos = -1
         self.mouse_Y_pos = -1
+        self.persist = persist
+        self.mover = tt.MotionCoalescer(self, snap=snap, on_moved=self.on_moved)
 
         # Entry validation functions
         self.vcmd_hour = (self.register(self.on_validate_hour), "%P")
         self.vcmd_min_sec = (self.register(self.on_validate_min_sec), "%P")
 
         # Window attributes
-        self.geometry("%dx%d+%d+%d" % (1, 1, 200, 200))  # On Linux, window seems to stick to its default size. This will prevent it
+        if persist:
+            # Reopens where it was left (kept on screen, in case the monitor layout changed)
+            x, y = utils.load_window_position((200, 200))
+            x = min(max(x, 0), self.winfo_screenwidth() - 50)
+            y = min(max(y, 0), self.winfo_screenheight() - 50)
+        else:
+            offset = 60 * (len(Clock.instances) - 1)   # Cascade extra windows
+            x, y = 200 + offset, 200 + offset
+        self.geometry("%dx%d+%d+%d" % (1, 1, x, y))  # On Linux, window seems to stick to its default size. This will prevent it
         self.wait_visibility(self)
         self.configure(bg=self.bg_color)
         self.wm_attributes("-alpha", 0.7)
@@ -84,28 +121,45 @@ class Clock(tk.Toplevel):
             self.overrideredirect(True)
             # self.attributes('-topmost', True)
             self.resizable(False, False)
-        self.windows = [pywinctl.Window(int(self.master.frame(), base=16)),
-                        pywinctl.Window(int(self.frame(), base=16))]
-        for win in self.windows:
-            win.alwaysOnTop()
+        self.windows = []
+        self.after_idle(self.set_always_on_top)    # Not needed for the first paint, so pywinctl loads afterwards
 
         # Event bindings
         self.bind('<KeyRelease>', self.on_key_press)
         self.bind('<Button-1>', self.on_enter)
         self.bind('<Button-3>', self.on_button3)
         self.bind('<B1-Motion>', self.on_motion)
-        self.master.bind('<<FOCUSIN>>', self.on_focusIn)
-        self.master.bind('<<MAP>>', self.on_map)
-        self.master.bind('<<UNMAP>>', self.on_unmap)
+        self.bind('<ButtonRelease-1>', self.mover.release)
+        if not getattr(self.master, "clock_events", False):
+            # Bound once per root, for every window: see dispatch()
+            self.master.bind('<<FOCUSIN>>', lambda e: Clock.dispatch(e, "on_focusIn"))
+            self.master.bind('<<MAP>>', lambda e: Clock.dispatch(e, "on_map"))
+            self.master.bind('<<UNMAP>>', lambda e: Clock.dispatch(e, "on_unmap"))
+            self.master.clock_events = True
+        self.ready = False      # Root events are only passed on once the window is complete
 
         # Widgets
-        self.label = tk.Label(self, bg=self.bg_color, font=(self.font, self.font_size), fg=self.font_color)
+        self.tcl_calls = render.TclCallCounter()
+        atlas = None
+        if self.use_glyphs:
+            # Tk font sizes are points, PIL's are pixels
+            atlas = render.GlyphAtlas.get(self, self.font_path.rstrip(os.sep),
+                                          int(round(self.font_size * self.winfo_fpixels("1i") / 72)),
+                                          self.font_color, self.bg_color)
+        if atlas:
+            self.label = tk.Canvas(self, bg=self.bg_color, highlightthickness=0, borderwidth=0)
+            self.label_view = render.GlyphView(self.label, atlas, self.tcl_calls, row=0, column=0)
+        else:
+            self.label = tk.Label(self, bg=self.bg_color, font=(self.font, self.font_size), fg=self.font_color)
+            self.label_view = render.WidgetView(self.label, self.tcl_calls, row=0, column=0)
         tt.Tooltip(self.label, text=self.tooltip)
 
-        img = tk.PhotoImage(file=self.resources_folder + "Alarm_set.png")
+        # Tk only takes bytes (or str) image data: this copies the small PNG out of the bundle
+        img = tk.PhotoImage(data=bytes(utils.resource_data(self.resources_folder + "Alarm_set.png")))
         self.alarm_image = tk.Label(self, image=img, bg=self.bg_color)
         self.alarm_image.image = img
         self.alarm_tt = tt.Tooltip(self.alarm_image, text="")
+        self.alarm_view = render.WidgetView(self.alarm_image, self.tcl_calls, self.alarm_tt, row=0, column=1)
 
         # Not used at the moment
         # img = tk.PhotoImage(file=self.resources_folder + "Alarm_not_set.png")
@@ -123,50 +177,138 @@ class Clock(tk.Toplevel):
         self.get_sec = tk.Entry(self, font=(self.font, self.font_size), width=2)
         tt.Tooltip(self.get_sec, text="Enter seconds (SS)")
 
+        # World clock: one row per timezone, all driven by the same tick
+        self.world = timekeeping.WorldClock(zones) if zones else None
+        self.zone_views = []
+        if self.world:
+            for row, zone in enumerate(self.world.zones, start=1):
+                tk.Label(self, bg=self.bg_color, text=zone.label, font=(self.font, self.font_size // 3),
+                         fg=self.font_color).grid(row=row, column=1, sticky="w")
+                label = tk.Label(self, bg=self.bg_color, font=(self.font, self.font_size // 2), fg=self.font_color)
+                self.zone_views.append(render.WidgetView(label, self.tcl_calls, row=row, column=0))
+
         self.geometry("")
 
         # Start program loop
         self.draw_clock()
+        self.ready = True
+        self.after_idle(self.start_services)
+
+    def start_services(self):
+        # Everything the first paint does not need: journal, history, sound, notifications and stats export.
+        # Their modules are only imported here
+        import history
+        import journal
+        if self.persist:
+            # Only the first window keeps a journal: extra windows of the same process would all write to one file
+            self.model.journal = journal.Journal(self.schedule_folder)
+            self.model.restore(self.model.journal.restore())
+        try:
+            self.model.history = history.History.get()     # Shared by all the windows
+        except (OSError, ValueError):
+            pass    # E.g. a read-only cache folder: just no history
+        self.start_notifier()
+        self.stats_exporter = stats.StatsExporter.get()     # One for the process, fed by every window
+        if self.stats_exporter is not None:
+            self.stats_exporter.add(self.tick_stats)
+            if self.stats_exporter.widget is None:
+                self.stats_exporter.attach(self.master, self.stats_interval)
+        if self.persist:
+            self.resync()   # Shows the restored alarms and timer
+
+    def start_notifier(self):
+        # One audio worker and one notification thread for the whole process, whatever the number of windows
+        if self.notifier is None:
+            import notifier
+            self.player = audio.AudioPlayer.get()
+            self.player.preload(self.beep_sound)
+            self.notifier = notifier.Notifier.get(self.beep_sound, self.resources_folder + "clock.ico",
+                                                  play=self.player.play)
+
+    def set_always_on_top(self):
+        import pywinctl
+        self.windows = [pywinctl.Window(int(self.master.frame(), base=16)),
+                        pywinctl.Window(int(self.frame(), base=16))]
+        for win in self.windows:
+            win.alwaysOnTop()
+
+    def on_timer(self):
+        # A scheduled tick. Redraws asked for by keys or commands call draw_clock() directly and are not wakeups
+        self.wakeups.add()
+        self.draw_clock()
 
     def draw_clock(self):
-        self.clock_mode = True
-
-        current_time = time.strftime("%H:%M:%S")
-        if self.alarm_set:
-            self.check_alarm(current_time)
-        elif self.timer_set:
-            self.check_timer()
-            if self.timer_set:
-                current_time = "00:" + str(format(self.minutes, "02d")) + ":" + str(format(self.seconds, "02d"))
-        self.label.configure(text=current_time)
-
-        if not self.label.grid_info():
-            self.label.grid(row=0, column=0)
-
-        if self.alarm_set:
-            if not self.alarm_image.grid_info():
-                self.alarm_image.grid(row=0, column=1)
-                self.alarm_tt.text = self.hh_alarm + ":" + self.mm_alarm
+        start = time.monotonic()
+
+        if self.hidden:
+            self.idle_tick()
+            return
+
+        now = time.time()
+        self.label_view.set_text(self.model.tick(now))
+        self.label_view.show()
+        if self.model.jumped:
+            # The pending tick was timed on the old wall clock: drop its stats, and the delay below re-arms the
+            # loop on the new second boundary
+            self.tick_due = None
+            if self.world:
+                self.world.invalidate()
+        if self.world:
+            for view, text in zip(self.zone_views, self.world.tick(now)):
+                view.set_text(text)
+                view.show()
+
+        alarm_set = self.model.alarm_set
+        self.alarm_view.show(alarm_set)
+        if alarm_set and self.alarms_version != self.model.alarms.version:
+            self.alarms_version = self.model.alarms.version
+            self.alarm_view.set_tooltip(self.model.alarms_text())
+        self.tcl_calls.end_tick()
+
+        if self.tick_due is not None:
+            self.tick_stats.record(self.tick_due, start, time.monotonic() - start)
+        if self.model.needs_frames():
+            self.schedule_tick(self.pacer.frame(start))
         else:
-            if self.alarm_image.grid_info():
-                self.alarm_image.grid_remove()
+            # Only whole seconds on display: back to one tick per second, on the second boundary
+            self.pacer.stop()
+            self.schedule_tick(self.model.next_tick_delay(time.time()))
 
-        self.callback_job = self.after(1000 - int(divmod(time.time(), 1)[1] * 1000), self.draw_clock)
+    def schedule_tick(self, delay):
+        delay_ms = max(int(delay * 1000), 1)
+        self.tick_due = time.monotonic() + delay_ms / 1000
+        self.callback_job = self.after(delay_ms, self.on_timer)
+
+    def idle_tick(self):
+        # While the window is hidden nothing is drawn: just fire what is due and sleep until the next deadline
+        self.callback_job = None
+        self.tick_due = None
+        self.pacer.stop()
+        self.model.tick()
+        delay = self.model.next_idle_delay(self.watchdog_interval, self.max_idle_delay)
+        if delay is not None:
+            self.schedule_tick(delay)
+
+    def resync(self):
+        # Redraws immediately and restarts the tick loop (only if no value is being entered)
+        if self.model.clock_mode:
+            self.stop_callback()
+            self.draw_clock()
 
     def remove_time_label(self):
-        if self.label.grid_info():
-            self.label.grid_remove()
+        self.label_view.hide()
 
     def stop_callback(self):
         if self.callback_job:
             self.after_cancel(self.callback_job)
             self.callback_job = None
+        self.tick_due = None
+        self.pacer.stop()
 
     def get_alarm_values(self):
         self.set_key_validators(on=True)
         self.remove_time_label()
         self.stop_callback()
-        self.clock_mode = False
 
         self.get_hour.delete(0, 'end')
         self.get_hour.insert(0, time.strftime("%H"))
@@ -187,19 +329,14 @@ class Clock(tk.Toplevel):
         self.set_key_validators(on=False)
 
     def start_alarm(self):
-        self.remove_alarm_values()
-        self.draw_clock()
-
-    def check_alarm(self, current_time):
-        if self.hh_alarm + ":" + self.mm_alarm + ":" + "00" == current_time:
-            self.beep()
-            self.alarm_set = False
+        if self.model.submit_alarm(self.get_hour.get(), self.get_min.get()) is not None:
+            self.remove_alarm_values()
+            self.draw_clock()
 
     def get_timer_values(self):
         self.set_key_validators(on=True)
         self.remove_time_label()
         self.stop_callback()
-        self.clock_mode = False
 
         self.get_min.delete(0, 'end')
         self.get_min.insert(0, '10')
@@ -219,39 +356,16 @@ class Clock(tk.Toplevel):
         self.get_sec.grid_remove()
         self.set_key_validators(on=False)
 
-    def start_timer(self, minutes, seconds):
-        self.remove_timer_values()
-
-        self.init_minutes = minutes
-        self.init_seconds = seconds
-        self.minutes = int(minutes)
-        self.seconds = int(seconds) + 1
-
-        self.draw_clock()
-
-    def check_timer(self):
-        if self.seconds == 0:
-            if self.minutes == 0:
-                self.timer_set = False
-            else:
-                self.seconds = 59
-                self.minutes -= 1
-        else:
-            self.seconds -= 1
-
-        if self.minutes == 0 and self.seconds == 0 and self.timer_set:
-            self.beep()
+    def start_timer(self):
+        if self.model.submit_timer(self.get_min.get(), self.get_sec.get()) is not None:
+            self.remove_timer_values()
+            self.draw_clock()
 
-    def beep(self):
-        if self.alarm_set:
-            message = "Your alarm time has arrived!!!"
-        elif self.timer_set:
-            message = "Your countdown for %s:%s finished!!!" % (self.init_minutes, self.init_seconds)
-        else:
+    def beep(self, message=None):
+        if message is None:
             message = "Oops, don't know why you're watching this. Likely, something went wrong :("
-
-        t = threading.Thread(target=utils.notify, args=(message, self.beep_sound, self.resources_folder + "clock.ico"))
-        t.start()
+        self.start_notifier()
+        self.notifier.notify(message)
 
     def on_enter(self, e=None):
         e.widget.focus_force()
@@ -259,27 +373,49 @@ class Clock(tk.Toplevel):
         self.mouse_Y_pos = e.y
 
     def on_motion(self, e=None):
-        self.geometry('+{0}+{1}'.format(e.x_root - self.mouse_X_pos, e.y_root - self.mouse_Y_pos))
+        self.mover.motion(e.x_root - self.mouse_X_pos, e.y_root - self.mouse_Y_pos)
+
+    def on_moved(self, position):
+        if self.persist:
+            utils.save_window_position(*position)
 
     def minimize(self):
         self.update_idletasks()
         self.state('withdrawn')  # Use this for fake roots (or it will generate two icons)
         # self.state('iconic')   # Use this for non-fake roots (or no icon will be present)
+        self.hidden = True
+        self.resync()
 
     def maximize(self):
         self.update_idletasks()
         self.state('normal')
+        self.hidden = False
+        self.resync()
 
     def on_button3(self, e=None):
         self.minimize()
 
+    @classmethod
+    def dispatch(cls, e, method):
+        # Root window events go to every open clock (closed ones are no longer in `instances`)
+        for clock in list(cls.instances):
+            if clock.ready:
+                getattr(clock, method)(e)
+
     def on_focusIn(self, e=None):
         if self.state() != "normal":
             self.maximize()
+        elif self.hidden:
+            # Shown again by the window manager: leave idle mode right away
+            self.hidden = False
+            self.resync()
 
     def on_map(self, e=None):
         if self.state() != "normal":
             self.maximize()
+        elif self.hidden:
+            self.hidden = False
+            self.resync()
 
     def on_unmap(self, e=None):
         if self.state() == "normal":
@@ -295,77 +431,204 @@ class Clock(tk.Toplevel):
             self.get_min.configure(validate="key", validatecommand="")
             self.get_sec.configure(validate="key", validatecommand="")
 
+    def close(self):
+        # Closes this window. The process ends with the last one
+        Clock.instances.remove(self)
+        # The journal writer is a daemon thread: let it write what is still queued before the process can end
+        if self.model.journal is not None:
+            self.model.journal.close(timeout=5)
+            self.model.journal = None
+        if self.stats_exporter is not None:
+            self.stats_exporter.remove(self.tick_stats)
+        if not Clock.instances:
+            if self.stats_exporter is not None:
+                self.stats_exporter.close()
+            if self.model.history is not None:
+                self.model.history.flush()
+            if self.notifier is not None:
+                self.player.close(timeout=0)
+                self.notifier.close(timeout=0)
+            self.master.destroy()
+            return
+        self.stop_callback()
+        if self.control is not None:
+            self.control.close()
+        self.destroy()
+
+    def on_commands(self, commands):
+        # Batch of commands from the control API (see control.py). Redraws once for the whole batch
+        import control
+        acks = [control.run_command(self.model, command) for command in commands]
+        self.resync()
+        return acks
+
     def on_validate_hour(self, new_value):
-        if not self.clock_mode and new_value.strip():
-            try:
-                value = int(new_value)
-                if value < 0 or value > 23 or len(new_value) > 2:
-                    self.bell()
-                    return False
-            except ValueError:
-                self.bell()
-                return False
-
-        return True
+        if self.model.validate_hour(new_value):
+            return True
+        self.bell()
+        return False
 
     def on_validate_min_sec(self, new_value):
-        if not self.clock_mode and new_value.strip():
-            try:
-                value = int(new_value)
-                if value < 0 or value > 59 or len(new_value) > 2:
-                    self.bell()
-                    return False
-            except ValueError:
-                self.bell()
-                return False
-
-        return True
+        if self.model.validate_min_sec(new_value):
+            return True
+        self.bell()
+        return False
 
     def on_key_press(self, e):
-        if e.keysym == "Escape":            # Escape --> QUIT
-            if self.clock_mode:
-                self.master.destroy()
-            else:
-                if self.timer_set:
-                    self.timer_set = False
-                    self.remove_timer_values()
-                if self.alarm_set:
-                    self.alarm_set = False
-                    self.remove_alarm_values()
-                self.draw_clock()
-
-        elif e.keysym in ("a", "A"):        # a, A --> Alarm mode
-            if self.clock_mode:
-                self.alarm_set = True
-                self.get_alarm_values()
-
-        elif e.keysym in ("t", "T"):         # t, T --> Timer mode
-            if self.clock_mode:
-                self.timer_set = True
-                self.get_timer_values()
-
-        elif e.keysym in ("s", "S"):         # s, S --> STOP Countdown / Alarm
-            if self.clock_mode:
-                self.timer_set = False
-                self.alarm_set = False
-                self.stop_callback()
-                self.draw_clock()
-
-        elif e.keysym == "Return":          # Return --> Gather Countdown / Alarm values
-            if self.alarm_set:
-                self.hh_alarm = str(format(int(self.get_hour.get()), "02d"))
-                self.mm_alarm = str(format(int(self.get_min.get()), "02d"))
-                self.start_alarm()
-            elif self.timer_set:
-                minutes = self.get_min.get()
-                seconds = self.get_sec.get()
-                if int(minutes) != 0 or int(seconds) != 0:
-                    self.start_timer(minutes, seconds)
+        action = self.model.on_key(e.keysym)
+        if action == "quit":
+            self.close()
+        elif action == "cancel_alarm_entry":
+            self.remove_alarm_values()
+            self.draw_clock()
+        elif action == "cancel_timer_entry":
+            self.remove_timer_values()
+            self.draw_clock()
+        elif action == "alarm_entry":
+            self.get_alarm_values()
+        elif action == "timer_entry":
+            self.get_timer_values()
+        elif action == "redraw":
+            self.resync()
+        elif action == "stop":
+            if self.player is not None:
+                self.player.stop()
+            self.stop_callback()
+            self.draw_clock()
+        elif action == "submit_alarm":
+            self.start_alarm()
+        elif action == "submit_timer":
+            self.start_timer()
+
+
+def import_files(clock, paths):
+    # A file that cannot be read is reported like its bad entries, and the others are still imported
+    import importer
+    report = lambda line, message: print("%s: %s" % (line, message))
+    for path in paths:
+        try:
+            importer.import_alarms(clock.model, path, on_error=report)
+        except (OSError, ValueError) as exc:
+            report(path, exc)
+    clock.resync()
+
+
+def check_zones(zones):
+    # Raises ValueError unless `zones` is None or a list of known timezone names
+    if zones is None:
+        return
+    if not isinstance(zones, list) or not all(isinstance(zone, str) for zone in zones):
+        raise ValueError("zones must be a list of timezone names")
+    import zoneinfo
+    for zone in zones:
+        try:
+            zoneinfo.ZoneInfo(zone)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise ValueError("unknown timezone: %s" % zone)
+
+
+def open_windows(root, commands):
+    # Handler of the single-instance server: later launches of the program end up here, as new windows.
+    # It runs in a Tk file handler, where any exception would end mainloop() and every window: none may escape
+    acks = []
+    for command in commands:
+        opened = len(Clock.instances)
+        try:
+            if not isinstance(command, dict) or command.get("cmd") != "new_window":
+                raise ValueError("unknown command: %r" % (command.get("cmd") if isinstance(command, dict) else command))
+            # Everything is checked before the Toplevel exists
+            check_zones(command.get("zones"))
+            frame_rate = int(command.get("fps", 30))
+            if frame_rate not in timekeeping.FramePacer.RATES:
+                raise ValueError("unsupported frame rate: %s" % frame_rate)
+            overdue = command.get("overdue", "fire")
+            if overdue not in model.ClockModel.OVERDUE_POLICIES:
+                raise ValueError("unknown overdue policy: %s" % overdue)
+            snap = int(command.get("snap", 0))
+            clock = Clock(root, zones=command.get("zones"), frame_rate=frame_rate, persist=False, snap=snap,
+                          overdue_policy=overdue)
+            if command.get("imports"):
+                import_files(clock, command["imports"])
+            acks.append({"ok": True, "cmd": "new_window", "windows": len(Clock.instances)})
+        except Exception as exc:
+            # A window left half built must not stay registered (the process ends with the last window)
+            for clock in Clock.instances[opened:]:
+                try:
+                    clock.stop_callback()
+                    clock.destroy()
+                except Exception:
+                    pass    # Its constructor may have failed before the callback existed
+            del Clock.instances[opened:]
+            acks.append({"ok": False, "cmd": command.get("cmd") if isinstance(command, dict) else None,
+                         "error": "%s: %s" % (type(exc).__name__, exc)})
+    return acks
+
+
+def forward_launch(args, zones):
+    # Asks a clock process that is already running to open the window instead. Returns whether it did
+    import control
+    command = {"cmd": "new_window", "zones": zones, "fps": args.fps, "snap": args.snap, "overdue": args.overdue,
+               "imports": [os.path.abspath(path) for path in args.imports]}
+    try:
+        acks = control.send(command, control.instance_address(), timeout=5.0)
+    except (OSError, ValueError):
+        return False    # Nobody listening (or a stale socket): this launch becomes the running instance
+    return bool(acks) and acks[0].get("ok", False)
 
 
 def main():
+    import argparse
+    import control
+    parser = argparse.ArgumentParser(description="Transparent clock by alef")
+    parser.add_argument("--zones", help="comma-separated timezones to show as a world clock, e.g. UTC,Asia/Tokyo")
+    parser.add_argument("--control", nargs="?", const="", metavar="ADDRESS",
+                        help="accept commands from scripts on a local socket (path, or TCP port on Windows)")
+    parser.add_argument("--import", dest="imports", action="append", default=[], metavar="FILE",
+                        help="add the events of an .ics or CSV file as alarms (can be repeated)")
+    parser.add_argument("--fps", type=int, choices=timekeeping.FramePacer.RATES, default=30,
+                        help="redraw rate while fractions of a second are shown (stopwatch, end of a countdown)")
+    parser.add_argument("--snap", nargs="?", type=int, const=20, default=0, metavar="PIXELS",
+                        help="stick to the screen edges when dragged closer than this (20 if no value is given)")
+    parser.add_argument("--overdue", choices=model.ClockModel.OVERDUE_POLICIES, default="fire",
+                        help="alarms missed by more than a minute (suspend, clock change): fire, skip or collapse "
+                             "them into one notification")
+    parser.add_argument("--new-process", action="store_true",
+                        help="do not open the window in an already running clock, start a separate process")
+    args = parser.parse_args()
+    zones = [zone.strip() for zone in args.zones.split(",") if zone.strip()] if args.zones else None
+    try:
+        check_zones(zones)
+    except ValueError as exc:
+        parser.error(str(exc))
+    for path in args.imports:
+        try:
+            open(path, "rb").close()
+        except OSError as exc:
+            parser.error("--import: %s" % exc)
+
+    if not args.new_process and forward_launch(args, zones):
+        return
+
     root = tt.FakeRoot("Clock by alef", utils.resource_path("resources/") + "clock.ico")
-    Clock(root)
+    clock = Clock(root, zones=zones, frame_rate=args.fps, snap=args.snap, overdue_policy=args.overdue)
+    if not args.new_process:
+        try:
+            instance = control.CommandServer(lambda commands: open_windows(root, commands), control.instance_address())
+            instance.attach(root)
+        except OSError:
+            pass    # E.g. the TCP port is taken: just run without single-instance mode
+    if args.control is not None:
+        address = args.control or None
+        if address and address.isdigit():
+            address = int(address)
+        try:
+            clock.control = control.CommandServer(clock.on_commands, address)
+        except OSError as exc:
+            parser.error("--control: %s" % exc)
+        # Idle callbacks run in order: commands and imports come after start_services() has opened the journal
+        clock.after_idle(clock.control.attach, clock)
+    if args.imports:
+        clock.after_idle(import_files, clock, args.imports)
     root.mainloop()
 
 
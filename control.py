@@ -0,0 +1,404 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Local control API, so scripts can set and cancel alarms and timers without the keyboard.
+
+Commands are JSON objects, one per line (or a JSON list of them, as a batch). Every line gets one JSON line back
+with an acknowledgement per command, including the scheduled fire time (epoch seconds) where it applies:
+
+{"cmd": "set_alarm", "time": "07:30", "name": "standup"}        (or "at": <epoch seconds>)
+{"cmd": "set_alarm", "repeat": "weekdays 09:00", "name": "standup"}    (see recurrence.py)
+{"cmd": "cancel_alarm", "name": "standup"}
+{"cmd": "start_timer", "minutes": 10, "seconds": 0}             ("hours" is accepted too)
+{"cmd": "cancel_timer"}
+{"cmd": "list"}
+{"cmd": "stopwatch", "action": "start"}                        (also "stop", "lap", "reset", "stats", "export")
+{"cmd": "stopwatch", "action": "export", "path": "/path/to/laps.csv"}
+{"cmd": "import", "path": "/path/to/calendar.ics"}            (see importer.py)
+
+On a TCP port (Windows), the first line of each connection must be the token the clock writes to
+control-<port>.token in the user's cache folder; send() does this.
+
+*** USAGE (client):
+python3 control.py '{"cmd": "start_timer", "minutes": 5}'       (uses the default address)
+python3 control.py --address /path/to/socket '[{"cmd": "list"}]'
+"""
+
+import json
+import math
+import os
+import select
+import socket
+import sys
+import threading
+import time
+import timekeeping
+import utils
+
+
+MAX_DURATION = 366 * 86400       # Seconds. Longest timer accepted
+MAX_PENDING = 1 << 20           # Bytes. A client with more unread replies, or a longer unfinished line, is dropped
+
+
+def finite(value, lowest, highest, what):
+    # `value` as a float, if it is a finite number in [lowest, highest]
+    value = float(value)
+    if not math.isfinite(value) or not lowest <= value <= highest:
+        raise ValueError("%s out of range: %r" % (what, value))
+    return value
+
+
+def default_address():
+    # A UNIX socket where available, a localhost TCP port otherwise
+    if hasattr(socket, "AF_UNIX"):
+        import tempfile
+        folder = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+        return os.path.join(folder, "clock_by_alef-%s.sock" % (os.getuid() if hasattr(os, "getuid") else "user"))
+    return 48213
+
+
+def instance_address():
+    # Where the first clock process listens for later launches (see clock.py), next to the control socket
+    address = default_address()
+    if isinstance(address, int):
+        return address + 1
+    return address[:-len(".sock")] + "-instance.sock"
+
+
+def token_path(port):
+    # TCP ports are open to every local process (and to browsers): clients must first send the token kept here,
+    # in the user's own cache folder
+    return os.path.join(utils.user_cache_dir(), "control-%d.token" % port)
+
+
+def create_token(port):
+    import secrets
+    token = secrets.token_hex(16)
+    path = token_path(port)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+    return token
+
+
+def read_token(port):
+    with open(token_path(port)) as f:
+        return f.read().strip()
+
+
+def run_command(model, command):
+    # Executes one command on a model.ClockModel and returns its acknowledgement
+    try:
+        kind = command["cmd"]
+        ack = {"ok": True, "cmd": kind}
+        if kind == "set_alarm":
+            if "repeat" in command:
+                alarm = model.add_recurring(str(command.get("name") or command["repeat"]), command["repeat"])
+            elif "at" in command:
+                fire_at = finite(command["at"], 0, timekeeping.MAX_TIME, "alarm time")
+                alarm = model.schedule_alarm(str(command.get("name") or fire_at), fire_at)
+            else:
+                hour, minute = (int(value) for value in command["time"].split(":")[:2])
+                if not (0 <= hour <= 23 and 0 <= minute <= 59):
+                    raise ValueError("time out of range: %s" % command["time"])
+                alarm = model.add_alarm(hour, minute, command.get("name"))
+            ack.update(name=alarm.name, fire_at=alarm.fire_at)
+        elif kind == "cancel_alarm":
+            ack["cancelled"] = model.cancel_alarm(str(command["name"]))
+        elif kind == "start_timer":
+            hours, minutes, seconds = (finite(command.get(key, 0), 0, MAX_DURATION, key)
+                                       for key in ("hours", "minutes", "seconds"))
+            duration = hours * 3600 + minutes * 60 + seconds
+            if not 0 < duration <= MAX_DURATION:
+                raise ValueError("timer duration must be positive and at most %d days" % (MAX_DURATION // 86400))
+            model.start_timer(minutes, seconds, hours)
+            ack["fire_at"] = time.time() + model.countdown.remaining()
+        elif kind == "cancel_timer":
+            ack["cancelled"] = model.cancel_timer()
+        elif kind == "import":
+            import importer
+            errors = []
+            ack["imported"], ack["past"] = importer.import_alarms(
+                model, command["path"], on_error=lambda line, message: errors.append("%s: %s" % (line, message)))
+            ack["errors"] = errors[:100]
+            ack["error_count"] = len(errors)
+        elif kind == "stopwatch":
+            watch = model.stopwatch
+            action = command["action"]
+            if action == "start":
+                watch.start()
+            elif action == "stop":
+                watch.stop()
+            elif action == "lap":
+                ack["lap_ns"] = model.stopwatch_lap()
+            elif action == "reset":
+                watch.reset()
+            elif action == "export":
+                ack["laps"] = watch.export_csv(command["path"])
+            elif action != "stats":
+                raise ValueError("unknown stopwatch action: %s" % action)
+            ack.update(elapsed_ns=watch.elapsed_ns(), running=watch.running, laps=len(watch.laps),
+                       best_ns=watch.best, worst_ns=watch.worst, mean_ns=watch.mean)
+        elif kind == "list":
+            ack["alarms"] = [{"name": alarm.name, "fire_at": alarm.fire_at, "repeat": model.recurring[alarm.name].text}
+                             if alarm.name in model.recurring else {"name": alarm.name, "fire_at": alarm.fire_at}
+                             for alarm in model.alarms]
+            ack["timer"] = {"fire_at": time.time() + model.countdown.remaining()} if model.timer_set else None
+        else:
+            raise ValueError("unknown command: %s" % kind)
+        return ack
+    except (KeyError, TypeError, ValueError, AttributeError, OSError, OverflowError) as exc:
+        return {"ok": False, "cmd": command.get("cmd") if isinstance(command, dict) else None, "error": str(exc)}
+
+
+class CommandServer:
+    # Accepts connections on a local socket and answers each JSON line with the acknowledgements returned by
+    # `handler(commands)`, called with the list of commands of that line.
+    # With Tk, sockets are watched through Tcl file handlers (no polling); where those are not available
+    # (Windows), a thread does the I/O and runs the handler on the Tk thread through after().
+    # Sockets never block: replies a client does not read yet wait in its outgoing buffer, sent when it is writable
+
+    def __init__(self, handler, address=None):
+        self.handler = handler
+        self.address = default_address() if address is None else address
+        self.buffers = {}
+        self.outgoing = {}              # Connection --> replies not sent yet
+        self.widget = None
+        self.tk = None                  # The tkinter module, once file handlers are used
+        self.commands = 0
+        self.token = None               # Required first line of every TCP connection
+        self.unauthenticated = set()
+        if isinstance(self.address, int):
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            if hasattr(socket, "SO_EXCLUSIVEADDRUSE"):
+                # Windows: no other socket may bind the same port while this one is open
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+            self.sock.bind(("127.0.0.1", self.address))
+            self.token = create_token(self.sock.getsockname()[1])
+        else:
+            utils.remove_stale_socket(self.address)
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            old_umask = os.umask(0o177)    # Only the owner may send commands
+            try:
+                self.sock.bind(self.address)
+            finally:
+                os.umask(old_umask)
+        self.sock.listen(16)
+        self.sock.setblocking(False)
+
+    def process(self, line):
+        # Never raises: with Tk, an exception escaping a file handler would end mainloop() and the whole clock
+        try:
+            commands = json.loads(line)
+        except (ValueError, RecursionError) as exc:
+            return json.dumps([{"ok": False, "error": "invalid JSON: %s" % exc}]).encode() + b"\n"
+        if not isinstance(commands, list):
+            commands = [commands]
+        self.commands += len(commands)
+        try:
+            return json.dumps(self.handler(commands)).encode() + b"\n"
+        except Exception as exc:
+            return json.dumps([{"ok": False, "error": "%s: %s" % (type(exc).__name__, exc)}]).encode() + b"\n"
+
+    def accept(self):
+        try:
+            conn, _ = self.sock.accept()
+        except (BlockingIOError, OSError):
+            return None
+        conn.setblocking(False)
+        self.buffers[conn] = bytearray()
+        self.outgoing[conn] = bytearray()
+        if self.token is not None:
+            self.unauthenticated.add(conn)
+        return conn
+
+    def receive(self, conn):
+        # Reads what is available on `conn` and answers every complete line. Returns False once it is closed
+        try:
+            data = conn.recv(65536)
+        except BlockingIOError:
+            return True
+        except OSError:
+            data = b""
+        if not data:
+            self.drop(conn)
+            return False
+        buffer = self.buffers[conn]
+        buffer += data
+        while True:
+            end = buffer.find(b"\n")
+            if end < 0:
+                break
+            line = bytes(buffer[:end])
+            del buffer[:end + 1]
+            if conn in self.unauthenticated:
+                import hmac
+                if not hmac.compare_digest(line.strip(), self.token.encode()):
+                    self.drop(conn)
+                    return False
+                self.unauthenticated.discard(conn)
+                continue
+            if line.strip():
+                self.outgoing[conn] += self.process(line)
+        if len(buffer) > MAX_PENDING:
+            self.drop(conn)
+            return False
+        return self.flush(conn)
+
+    def flush(self, conn):
+        # Sends what the socket takes right now. Returns False if the connection was dropped
+        pending = self.outgoing[conn]
+        if pending:
+            try:
+                del pending[:conn.send(pending)]
+            except BlockingIOError:
+                pass
+            except OSError:
+                self.drop(conn)
+                return False
+        if len(pending) > MAX_PENDING:
+            self.drop(conn)
+            return False
+        if self.tk is not None:
+            # Also wait for the socket to be writable while replies are pending. Replaces the previous handler
+            mask = self.tk.READABLE | (self.tk.WRITABLE if pending else 0)
+            self.widget.tk.createfilehandler(conn, mask, lambda file, mask: self.on_ready(conn, mask))
+        return True
+
+    def on_ready(self, conn, mask):
+        if mask & self.tk.WRITABLE and not self.flush(conn):
+            return
+        if mask & self.tk.READABLE:
+            self.receive(conn)
+
+    def drop(self, conn):
+        if self.tk is not None:
+            self.widget.tk.deletefilehandler(conn)
+        self.buffers.pop(conn, None)
+        self.outgoing.pop(conn, None)
+        self.unauthenticated.discard(conn)
+        conn.close()
+
+    # ---- Tk integration
+
+    def attach(self, widget):
+        self.widget = widget
+        if hasattr(widget.tk, "createfilehandler") and os.name != "nt":
+            import tkinter
+            self.tk = tkinter
+            widget.tk.createfilehandler(self.sock, tkinter.READABLE, lambda *args: self.on_accept())
+        else:
+            threading.Thread(target=self.serve_threaded, name="CommandServer", daemon=True).start()
+
+    def on_accept(self):
+        conn = self.accept()
+        if conn is not None:
+            self.flush(conn)    # Registers its handler
+
+    def serve_threaded(self):
+        # Blocking I/O in this thread; the handler itself always runs on the Tk thread
+        def handler_on_tk(commands, handler=self.handler):
+            done = threading.Event()
+            result = []
+
+            def run():
+                try:
+                    result.append(handler(commands))
+                except Exception as exc:
+                    result.append([{"ok": False, "error": "%s: %s" % (type(exc).__name__, exc)}])
+                finally:
+                    done.set()
+            self.widget.after(0, run)
+            done.wait()
+            return result[0]
+        self.handler = handler_on_tk
+        self.sock.setblocking(True)
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.buffers[conn] = bytearray()
+            self.outgoing[conn] = bytearray()
+            if self.token is not None:
+                self.unauthenticated.add(conn)
+            threading.Thread(target=self.serve_connection, args=(conn,), daemon=True).start()
+
+    def serve_connection(self, conn):
+        conn.setblocking(False)
+        while conn in self.buffers:
+            readable, writable, _ = select.select([conn], [conn] if self.outgoing[conn] else [], [])
+            if writable and not self.flush(conn):
+                return
+            if readable and not self.receive(conn):
+                return
+
+    # ---- Without Tk (tools and benchmarks)
+
+    def serve(self, stop=None):
+        while stop is None or not stop.is_set():
+            readable, writable, _ = select.select([self.sock] + list(self.buffers),
+                                                  [conn for conn in self.outgoing if self.outgoing[conn]], [], 0.1)
+            for conn in writable:
+                if conn in self.outgoing:
+                    self.flush(conn)
+            for sock in readable:
+                if sock is self.sock:
+                    self.accept()
+                elif sock in self.buffers:
+                    self.receive(sock)
+
+    def close(self):
+        for conn in list(self.buffers):
+            self.drop(conn)
+        if self.token is not None:
+            try:
+                os.remove(token_path(self.sock.getsockname()[1]))
+            except OSError:
+                pass
+        self.sock.close()
+        if not isinstance(self.address, int):
+            try:
+                utils.remove_stale_socket(self.address)
+            except OSError:
+                pass
+
+
+def send(commands, address=None, timeout=5.0):
+    # Client side: sends one command (or a list of them) and returns the acknowledgements
+    address = default_address() if address is None else address
+    if isinstance(address, int):
+        token = read_token(address)
+        conn = socket.create_connection(("127.0.0.1", address), timeout)
+        conn.sendall(token.encode() + b"\n")
+    else:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(timeout)
+        conn.connect(address)
+    with conn:
+        conn.sendall(json.dumps(commands).encode() + b"\n")
+        reply = b""
+        while not reply.endswith(b"\n"):
+            data = conn.recv(65536)
+            if not data:
+                break
+            reply += data
+    return json.loads(reply)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Send commands to a running clock")
+    parser.add_argument("--address", help="socket path (or TCP port) of the clock")
+    parser.add_argument("commands", help="JSON command, or JSON list of commands")
+    args = parser.parse_args()
+    address = args.address
+    if address is not None and address.isdigit():
+        address = int(address)
+    print(json.dumps(send(json.loads(args.commands), address), indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
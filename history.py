@@ -0,0 +1,212 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+History of fired alarms and timers, kept in a fixed-size ring file of binary records read and written through mmap,
+so disk usage is bounded and queries never load the whole file.
+
+Layout: header (MAGIC, capacity, records written so far), then `capacity` records of
+(timestamp: epoch seconds, latency: seconds from due time to firing, kind, label). The label is kept in the record
+itself, as UTF-8 cut to LABEL_SIZE bytes, so the file never grows past its capacity. Writers from several processes
+take a lock on the file for each record.
+
+*** USAGE:
+python3 history.py                                  (every record, oldest first)
+python3 history.py --since 2026-10-01 --until 2026-10-15T12:00 --kind alarm --limit 20
+"""
+
+import mmap
+import os
+import struct
+import sys
+import time
+import utils
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+MAGIC = b"CLKHIST2"
+LABEL_SIZE = 51
+HEADER = struct.Struct("<8sQQ")         # Magic, capacity, records written
+RECORD = struct.Struct("<dfB%ds" % LABEL_SIZE)     # Timestamp, latency, kind, label (64 bytes)
+KINDS = ("alarm", "timer", "recurring", "missed")
+HISTORY_FILE = os.path.join(utils.user_cache_dir(), "history.bin")
+
+
+def lock(f):
+    # Exclusive lock on the whole file, shared by every process writing to it. Blocks until it is free
+    if os.name == "nt":
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+def unlock(f):
+    if os.name == "nt":
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def encode_label(label):
+    # One line, cut to LABEL_SIZE bytes without splitting a character
+    data = " ".join(str(label).split()).encode("utf-8")[:LABEL_SIZE]
+    return data.decode("utf-8", "ignore").encode("utf-8")
+
+
+class History:
+    # Ring of the latest `capacity` records. Writes go straight to the shared mapping (no read-modify-write of
+    # the file) under the file lock, so clocks in several processes never take the same slot, and a query
+    # binary-searches the time range, then reads only the records inside it.
+    # Records are assumed to be in time order: after the wall clock is stepped back, ranges around the step are
+    # approximate
+
+    histories = {}
+
+    @classmethod
+    def get(cls, path=HISTORY_FILE, capacity=262144):
+        # One History per file and process, shared by all the clock windows
+        if path not in cls.histories:
+            cls.histories[path] = cls(path, capacity)
+        return cls.histories[path]
+
+    def __init__(self, path=HISTORY_FILE, capacity=262144, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self.file = None                # Kept open by writers, for the lock
+        if readonly:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < HEADER.size:
+                    raise ValueError("empty history file: %s" % path)
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.file = open(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+            try:
+                self.create(capacity)
+            except Exception:
+                self.file.close()
+                raise
+        magic, self.capacity, _ = HEADER.unpack_from(self.map)
+        if magic != MAGIC or len(self.map) < HEADER.size + self.capacity * RECORD.size:
+            self.close()
+            raise ValueError("not a history file: %s" % path)
+
+    def create(self, capacity):
+        # Maps the file, first writing the header if it is new. Under the lock, so two processes starting at
+        # once do not both initialize it
+        lock(self.file)
+        try:
+            if os.fstat(self.file.fileno()).st_size < HEADER.size:
+                # New file: sparse, so disk space is only used as records are written
+                self.file.truncate(HEADER.size + capacity * RECORD.size)
+                self.file.seek(0)
+                self.file.write(HEADER.pack(MAGIC, capacity, 0))
+                self.file.flush()
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_WRITE)
+        finally:
+            unlock(self.file)
+
+    @property
+    def written(self):
+        return HEADER.unpack_from(self.map)[2]
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    # ---- Writing
+
+    def record(self, kind, label, latency=0.0, timestamp=None):
+        data = encode_label(label)
+        lock(self.file)
+        try:
+            written = self.written
+            offset = HEADER.size + (written % self.capacity) * RECORD.size
+            RECORD.pack_into(self.map, offset, time.time() if timestamp is None else timestamp, latency,
+                             KINDS.index(kind), data)
+            # The record is complete before the count that makes it visible
+            HEADER.pack_into(self.map, 0, MAGIC, self.capacity, written + 1)
+        finally:
+            unlock(self.file)
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.close()
+        if self.file is not None:
+            self.file.close()
+        if self.histories.get(self.path) is self:
+            del self.histories[self.path]
+
+    # ---- Reading
+
+    def raw(self, index):
+        # (timestamp, latency, kind code, label bytes) of the index-th record still kept, oldest first
+        written = self.written
+        first = max(written - self.capacity, 0)
+        return RECORD.unpack_from(self.map, HEADER.size + ((first + index) % self.capacity) * RECORD.size)
+
+    def timestamp(self, index):
+        written = self.written
+        first = max(written - self.capacity, 0)
+        return struct.unpack_from("<d", self.map, HEADER.size + ((first + index) % self.capacity) * RECORD.size)[0]
+
+    def bisect(self, t):
+        # Index of the first record at or after `t`. Records are appended in time order, so this is a binary search
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp(mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(self, since=None, until=None, kinds=None):
+        # Yields (timestamp, kind, label, latency) in [since, until), oldest first, reading only those records
+        codes = None if kinds is None else {KINDS.index(kind) for kind in kinds}
+        start = 0 if since is None else self.bisect(since)
+        end = len(self) if until is None else self.bisect(until)
+        for index in range(start, end):
+            timestamp, latency, code, label = self.raw(index)
+            if codes is None or code in codes:
+                yield timestamp, KINDS[code], label.rstrip(b"\0").decode("utf-8", "replace"), latency
+
+
+def parse_when(text):
+    # Epoch seconds, or an ISO date / date and time (local time)
+    try:
+        return float(text)
+    except ValueError:
+        import datetime
+        return datetime.datetime.fromisoformat(text).timestamp()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Show the history of fired alarms and timers")
+    parser.add_argument("--file", default=HISTORY_FILE, help="history file (default: %(default)s)")
+    parser.add_argument("--since", type=parse_when, help="epoch seconds or ISO date/time (local)")
+    parser.add_argument("--until", type=parse_when, help="epoch seconds or ISO date/time (local), excluded")
+    parser.add_argument("--kind", action="append", choices=KINDS, help="only these kinds (can be repeated)")
+    parser.add_argument("--limit", type=int, help="show at most this many records")
+    args = parser.parse_args()
+    try:
+        history = History(args.file, readonly=True)
+    except (OSError, ValueError) as exc:
+        print(exc)
+        return 1
+    for count, (timestamp, kind, label, latency) in enumerate(history.query(args.since, args.until, args.kind)):
+        if args.limit is not None and count >= args.limit:
+            break
+        print("%s  %-9s %8.3f s  %s" % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)), kind,
+                                        latency, label))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
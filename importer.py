@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Bulk import of alarms from calendar exports (.ics) and CSV files.
+
+Files are streamed line by line, so memory does not depend on their size. Every event becomes an alarm at an
+absolute (epoch) time; malformed entries are reported through `on_error(line_number, message)` and skipped.
+Both formats are read as UTF-8, with invalid bytes replaced (a time that is not readable then is reported like any
+other bad entry).
+
+CSV rows: time,label[,name]. `time` is "YYYY-MM-DD HH:MM[:SS]" (local time unless it carries an offset or Z),
+"HH:MM" (next occurrence) or epoch seconds. A header row is skipped.
+ICS: one alarm per VEVENT at DTSTART, moved by the first VALARM TRIGGER (e.g. -PT15M) if there is one.
+
+*** USAGE:
+python3 importer.py FILE...          (parse and report, without scheduling anything)
+"""
+
+import csv
+import datetime
+import re
+import sys
+import time
+import timekeeping
+import utils
+
+
+def parse_time(text, now=None):
+    # Lenient parsing of a CSV time field into epoch seconds. Raises ValueError if it makes no sense
+    text = text.strip()
+    if not text:
+        raise ValueError("empty time")
+    if re.fullmatch(r"\d{1,2}:\d{2}", text):
+        hour, minute = (int(value) for value in text.split(":"))
+        if not (0 <= hour <= 23 and 0 <= minute <= 59):
+            raise ValueError("time out of range: %s" % text)
+        return timekeeping.next_wall_time(hour, minute, now=now)
+    if re.fullmatch(r"-?\d+(\.\d*)?", text):
+        return utils.to_float(text, 3)
+    if text.endswith(("Z", "z")):
+        text = text[:-1] + "+00:00"
+    moment = datetime.datetime.fromisoformat(text)
+    return moment.timestamp()     # Naive datetimes are taken as local time
+
+
+def parse_ics_time(value, params):
+    # DTSTART value and parameters: UTC ("...Z"), floating/local, TZID=... or a whole day (VALUE=DATE)
+    value = value.strip()
+    if params.get("VALUE") == "DATE" or re.fullmatch(r"\d{8}", value):
+        return datetime.datetime.strptime(value, "%Y%m%d").timestamp()
+    utc = value.endswith("Z")
+    moment = datetime.datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+    if utc:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    elif "TZID" in params:
+        import zoneinfo
+        try:
+            moment = moment.replace(tzinfo=zoneinfo.ZoneInfo(params["TZID"].strip('"')))
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            pass    # Unknown zone (e.g. a Windows name): take it as local time
+    return moment.timestamp()
+
+
+_DURATION = re.compile(r"([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+
+def parse_duration(value):
+    match = _DURATION.match(value.strip())
+    if not match or value.strip() in ("P", "-P", "+P"):
+        raise ValueError("bad duration: %s" % value)
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    total = (int(weeks or 0) * 7 * 86400 + int(days or 0) * 86400 + int(hours or 0) * 3600 +
+             int(minutes or 0) * 60 + int(seconds or 0))
+    return -total if sign == "-" else total
+
+
+def _report(on_error, line, message):
+    if on_error is not None:
+        on_error(line, message)
+
+
+def iter_csv(path, on_error=None, now=None):
+    # Yields (name, fire_at, label)
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        reader = csv.reader(f)
+        for row in reader:
+            line = "%s:%d" % (path, reader.line_num)
+            if not row or not any(field.strip() for field in row):
+                continue
+            if row[0].strip().lower() in ("time", "when", "start", "dtstart"):
+                continue    # Header
+            try:
+                fire_at = parse_time(row[0], now)
+                if not timekeeping.valid_time(fire_at):
+                    raise ValueError("out of range")
+                label = row[1].strip() if len(row) > 1 and row[1].strip() else time.strftime(
+                    "%Y-%m-%d %H:%M", time.localtime(fire_at))
+                name = row[2].strip() if len(row) > 2 and row[2].strip() else "%s@%d" % (label, fire_at)
+            except (ValueError, OverflowError, OSError) as exc:
+                _report(on_error, line, "bad time %r (%s)" % (row[0][:40], exc))
+                continue
+            yield name, fire_at, label
+
+
+def iter_ics(path, on_error=None):
+    # Yields (name, fire_at, label). Folded lines (continuations starting with a space or tab) are unfolded
+    def unfolded(f):
+        current = None
+        start = 0
+        for number, raw in enumerate(f, 1):
+            raw = raw.rstrip("\r\n")
+            if raw[:1] in (" ", "\t") and current is not None:
+                current += raw[1:]
+                continue
+            if current is not None:
+                yield start, current
+            current, start = raw, number
+        if current is not None:
+            yield start, current
+
+    with open(path, encoding="utf-8-sig", errors="replace") as f:
+        event = None
+        in_alarm = False
+        for number, line in unfolded(f):
+            name, _, value = line.partition(":")
+            name, *params = name.split(";")
+            name = name.upper()
+            if name == "BEGIN" and value.upper() == "VEVENT":
+                event = {"line": number}
+            elif event is None:
+                continue
+            elif name == "BEGIN" and value.upper() == "VALARM":
+                in_alarm = True
+            elif name == "END" and value.upper() == "VALARM":
+                in_alarm = False
+            elif name == "END" and value.upper() == "VEVENT":
+                where = "%s:%d" % (path, event["line"])
+                try:
+                    if "DTSTART" not in event:
+                        raise ValueError("event without DTSTART")
+                    fire_at = parse_ics_time(*event["DTSTART"])
+                    if "TRIGGER" in event:
+                        fire_at += parse_duration(event["TRIGGER"])
+                    if not timekeeping.valid_time(fire_at):
+                        raise ValueError("time out of range")
+                    label = event.get("SUMMARY") or time.strftime("%Y-%m-%d %H:%M", time.localtime(fire_at))
+                    name = event.get("UID") or "%s@%d" % (label, fire_at)
+                except (ValueError, OverflowError, OSError) as exc:
+                    _report(on_error, where, str(exc))
+                else:
+                    yield name, fire_at, label
+                event = None
+                in_alarm = False
+            elif name == "DTSTART" and not in_alarm:
+                event["DTSTART"] = (value, dict(param.split("=", 1) for param in params if "=" in param))
+            elif name == "TRIGGER" and in_alarm and "TRIGGER" not in event:
+                if not any(param.upper().startswith("VALUE=DATE") for param in params):
+                    event["TRIGGER"] = value
+            elif name in ("SUMMARY", "UID") and not in_alarm:
+                event[name] = value.replace("\\,", ",").replace("\\;", ";").replace("\\n", " ").strip()
+
+
+def iter_events(path, on_error=None, now=None):
+    if path.lower().endswith((".ics", ".ical", ".ifb", ".icalendar")):
+        return iter_ics(path, on_error)
+    return iter_csv(path, on_error, now)
+
+
+def import_alarms(model, path, on_error=None, now=None, skip_past=True, batch=1000):
+    # Streams the events of `path` into the model's alarm schedule, in batches. Returns (imported, skipped past)
+    if now is None:
+        now = time.time()
+    imported = past = 0
+    items = []
+    try:
+        for name, fire_at, label in iter_events(path, on_error, now):
+            if skip_past and fire_at <= now:
+                past += 1
+                continue
+            items.append((name, fire_at, label))
+            if len(items) >= batch:
+                imported += model.schedule_alarms(items)
+                items = []
+    finally:
+        # Even if reading fails midway, the events parsed so far are kept
+        if items:
+            imported += model.schedule_alarms(items)
+    return imported, past
+
+
+def main():
+    errors = []
+    for path in sys.argv[1:]:
+        count = 0
+        for _ in iter_events(path, lambda line, message: errors.append((line, message))):
+            count += 1
+        print("%s: %d events" % (path, count))
+    for line, message in errors:
+        print("%s: %s" % (line, message))
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
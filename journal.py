@@ -0,0 +1,134 @@
+import json
+import os
+import queue
+import threading
+
+
+class Journal:
+    # Crash-safe persistence of the alarm and countdown schedule.
+    # Every change is appended to a log file by a background thread (so the Tk thread never waits for the disk),
+    # and every `compact_every` changes the whole schedule is written to a snapshot and the log starts over.
+    # Records are idempotent (set/cancel by name), so replaying a log on top of a newer snapshot is harmless.
+    #
+    # Records: {"op": "alarm", "name", "fire_at", "label"}, {"op": "cancel", "name"},
+    #          {"op": "timer", "deadline", "duration"} (wall-clock deadline), {"op": "timer_cancel"}, {"op": "clear"},
+    #          {"op": "recurring", "name", "rule", "label"} (its occurrences are recomputed on restore)
+
+    def __init__(self, folder, compact_every=1000, fsync=True):
+        self.folder = folder
+        self.snapshot_path = os.path.join(folder, "schedule.json")
+        self.log_path = os.path.join(folder, "schedule.log")
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.state = None
+        self.queue = queue.Queue()
+        self.thread = None
+        self.written = 0
+        self.compactions = 0
+
+    # ---- Restore (at startup, before anything is recorded)
+
+    def restore(self):
+        # Returns {"alarms": {name: [fire_at, label]}, "recurring": {name: [rule, label]},
+        #          "timer": [deadline, duration] or None}
+        state = {"alarms": {}, "recurring": {}, "timer": None}
+        try:
+            with open(self.snapshot_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            pass
+        state.setdefault("recurring", {})      # Snapshots written before recurring alarms existed
+        try:
+            with open(self.log_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break       # Torn last write after a crash
+                    apply(state, record)
+        except OSError:
+            pass
+        self.state = state
+        return state
+
+    # ---- Recording
+
+    def record(self, record):
+        if self.thread is None:
+            if self.state is None:
+                self.restore()
+            self.thread = threading.Thread(target=self.run, name="Journal", daemon=True)
+            self.thread.start()
+        self.queue.put(record)
+
+    def close(self, timeout=None):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout)
+            self.thread = None
+
+    def run(self):
+        os.makedirs(self.folder, exist_ok=True)
+        log = open(self.log_path, "a")
+        pending = 0
+        try:
+            while True:
+                record = self.queue.get()
+                if record is None:
+                    return
+                # Write everything already queued in one go
+                records = [record]
+                while True:
+                    try:
+                        record = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if record is None:
+                        self.queue.put(None)
+                        break
+                    records.append(record)
+                for record in records:
+                    apply(self.state, record)
+                    log.write(json.dumps(record) + "\n")
+                self.sync(log)
+                self.written += len(records)
+                pending += len(records)
+                if pending >= self.compact_every:
+                    log.close()
+                    self.compact()
+                    log = open(self.log_path, "w")
+                    pending = 0
+        finally:
+            log.close()
+
+    def sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def compact(self):
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+            self.sync(f)
+        os.replace(tmp, self.snapshot_path)
+        self.compactions += 1
+
+
+def apply(state, record):
+    op = record.get("op")
+    if op == "alarm":
+        state["alarms"][record["name"]] = [record["fire_at"], record.get("label")]
+    elif op == "recurring":
+        state["recurring"][record["name"]] = [record["rule"], record.get("label")]
+    elif op == "cancel":
+        state["alarms"].pop(record["name"], None)
+        state["recurring"].pop(record["name"], None)
+    elif op == "timer":
+        state["timer"] = [record["deadline"], record.get("duration")]
+    elif op == "timer_cancel":
+        state["timer"] = None
+    elif op == "clear":
+        state["alarms"] = {}
+        state["recurring"] = {}
+        state["timer"] = None
@@ -0,0 +1,345 @@
+import math
+import time
+import timekeeping
+
+
+class ClockModel:
+    # Clock, alarm and timer state machine. It knows nothing about Tk, so it can be driven (and profiled) headless:
+    # the Tk Clock only draws what it says, feeds it key presses and entry values, and calls tick() on a timer.
+    # Fired alarms and countdowns are reported through `notify(message)`, and every schedule change is recorded in
+    # `journal` (a journal.Journal), if there is one.
+    # Alarms found more than `overdue_grace` seconds late (after a suspend or a wall-clock step) follow
+    # `overdue_policy`: "fire" them all, "skip" them, or "collapse" them into one notification
+
+    OVERDUE_POLICIES = ("fire", "skip", "collapse")
+
+    def __init__(self, notify=None, wall=time.time, clock=timekeeping.uptime, journal=None, overdue_policy="fire"):
+        if overdue_policy not in self.OVERDUE_POLICIES:
+            raise ValueError("unknown overdue policy: %s" % overdue_policy)
+        self.notify = notify if notify is not None else (lambda message: None)
+        self.wall = wall
+        self.journal = journal
+        self.overdue_policy = overdue_policy
+        self.overdue_grace = 60.0
+        self.watchdog = timekeeping.ClockWatchdog(wall, clock)
+        self.jumped = 0.0           # Wall-clock step seen by the last tick (seconds), 0.0 if none
+        self.history = None         # history.History where fired alarms and timers are recorded, if any
+        self.countdown = timekeeping.Countdown(clock)
+        self.stopwatch = timekeeping.Stopwatch()
+        self.frame_rate = 30        # Redraws per second while fractions of a second are shown
+        self.fine_countdown = 10    # Last seconds of a countdown shown in tenths
+        self.alarms = timekeeping.AlarmSchedule()
+        self.recurring = {}         # Name --> recurrence.Recurrence of the alarms that are rescheduled when they fire
+        self.clock_mode = True      # False while the user is entering values
+        self.entry_mode = None      # "alarm" or "timer" while entering values
+        self.alarm_set = False
+        self.timer_set = False
+
+    # ---- Ticks
+
+    def tick(self, now=None):
+        # Fires whatever is due and returns the text to display
+        if now is None:
+            now = self.wall()
+        self.jumped = self.watchdog.check(now)
+        if self.alarm_set:
+            self.check_alarm(now)
+        if self.timer_set:
+            self.check_timer()
+        if self.stopwatch.active:
+            return self.stopwatch.format()
+        if self.timer_set:
+            return self.countdown.format(precision=1 if self.countdown.remaining() <= self.fine_countdown else 0)
+        return time.strftime("%H:%M:%S", time.localtime(now))
+
+    def check_alarm(self, now=None):
+        # Fires every alarm whose time has been reached, even if the tick at its exact second was late or skipped
+        if now is None:
+            now = self.wall()
+        overdue = []
+        for alarm in self.alarms.due(now):
+            rule = self.recurring.get(alarm.name)
+            if now - alarm.fire_at > self.overdue_grace and self.overdue_policy != "fire":
+                overdue.append(alarm)
+                self.log_event("missed", alarm.label, now - alarm.fire_at, now)
+            else:
+                self.notify("Your alarm for %s has arrived!!!" % alarm.label)
+                self.log_event("alarm" if rule is None else "recurring", alarm.label, now - alarm.fire_at, now)
+            if rule is None:
+                self.log_change({"op": "cancel", "name": alarm.name})
+                continue
+            # Next occurrence after now: occurrences missed meanwhile were just handled as one
+            fire_at = rule.next_after(now)
+            if fire_at is not None:
+                self.alarms.add(alarm.name, fire_at, alarm.label)
+            else:
+                del self.recurring[alarm.name]
+                self.log_change({"op": "cancel", "name": alarm.name})
+        if overdue and self.overdue_policy == "collapse":
+            labels = ", ".join(alarm.label for alarm in overdue[:5])
+            if len(overdue) > 5:
+                labels += " (+%d more)" % (len(overdue) - 5)
+            self.notify("You missed %d alarm%s: %s" % (len(overdue), "s" if len(overdue) > 1 else "", labels))
+        self.alarm_set = bool(self.alarms)
+
+    def check_timer(self):
+        if self.countdown.expired():
+            self.notify("Your countdown for %s finished!!!" % self.countdown.describe())
+            self.log_event("timer", self.countdown.describe(), self.countdown.clock() - self.countdown.deadline)
+            self.countdown.cancel()
+            self.timer_set = False
+            self.log_change({"op": "timer_cancel"})
+
+    def needs_frames(self):
+        # Whether fractions of a second are on display (so it must be redrawn at the frame rate, not once a second)
+        if self.stopwatch.active:
+            return self.stopwatch.running
+        return self.timer_set and self.countdown.remaining() <= self.fine_countdown
+
+    def next_tick_delay(self, now=None):
+        # Seconds until the displayed text changes (the Tk view paces frames itself, see timekeeping.FramePacer)
+        if self.needs_frames():
+            # Shown time is always read from the stopwatch / deadline, so the redraw rate does not cause drift
+            return 1.0 / self.frame_rate
+        if self.timer_set and not self.stopwatch.active:
+            # Aim for the moment the countdown turns over its next second, not the wall-clock second
+            return self.countdown.next_change()
+        if now is None:
+            now = self.wall()
+        return 1 - divmod(now, 1)[1]
+
+    def next_deadline_delay(self, now=None):
+        # Seconds until the next alarm or countdown is due, or None if nothing is pending
+        delays = []
+        if self.alarm_set:
+            delays.append(self.alarms.next_due() - (self.wall() if now is None else now))
+        if self.timer_set:
+            delays.append(self.countdown.remaining())
+        return max(min(delays), 0) if delays else None
+
+    def next_idle_delay(self, watchdog_interval=60.0, max_delay=600.0, now=None):
+        # Seconds a hidden clock may sleep: until the next deadline, but at most `watchdog_interval` while alarms
+        # are pending (the wall clock may step meanwhile) and `max_delay` otherwise. None if nothing is pending
+        delay = self.next_deadline_delay(now)
+        if delay is None:
+            return None
+        return min(delay, watchdog_interval if self.alarm_set else max_delay)
+
+    def alarms_text(self, limit=5):
+        lines = [alarm.label for alarm in self.alarms.upcoming(limit)]
+        if len(self.alarms) > limit:
+            lines.append("(+%d more)" % (len(self.alarms) - limit))
+        return "\n".join(lines)
+
+    # ---- Commands
+
+    def begin_entry(self, mode):
+        if not self.clock_mode:
+            return False
+        self.clock_mode = False
+        self.entry_mode = mode
+        return True
+
+    def cancel_entry(self):
+        mode = self.entry_mode
+        self.entry_mode = None
+        self.clock_mode = True
+        return mode
+
+    def add_alarm(self, hour, minute, name=None):
+        if name is None:
+            name = "%02d:%02d" % (hour, minute)
+        return self.schedule_alarm(name, timekeeping.next_wall_time(hour, minute, now=self.wall()))
+
+    def schedule_alarm(self, name, fire_at, label=None):
+        self.forget_rule(name)
+        alarm = self.alarms.add(name, fire_at, label)
+        self.alarm_set = True
+        self.log_change({"op": "alarm", "name": name, "fire_at": fire_at, "label": alarm.label})
+        return alarm
+
+    def add_recurring(self, name, rule, label=None):
+        # Alarm repeating by `rule` (see recurrence.py). Raises ValueError if the rule is not valid or never fires
+        import recurrence   # Only loaded once a recurring alarm is set (it pulls in calendar and datetime)
+        compiled = recurrence.compile_rule(rule)
+        fire_at = compiled.next_after(self.wall())
+        if fire_at is None:
+            raise ValueError("rule never fires: %s" % rule)
+        if label is None:
+            label = rule if name == rule else "%s (%s)" % (name, rule)
+        alarm = self.alarms.add(name, fire_at, label)
+        self.recurring[name] = compiled
+        self.alarm_set = True
+        self.log_change({"op": "recurring", "name": name, "rule": rule, "label": alarm.label})
+        return alarm
+
+    def schedule_alarms(self, items):
+        # Bulk version of schedule_alarm() for (name, fire_at, label) items
+        if self.recurring:
+            for name, _, _ in items:
+                self.forget_rule(name)
+        count = self.alarms.add_many(items)
+        self.alarm_set = bool(self.alarms)
+        for name, fire_at, label in items:
+            self.log_change({"op": "alarm", "name": name, "fire_at": fire_at, "label": label or name})
+        return count
+
+    def forget_rule(self, name):
+        # A one-shot alarm taking the name of a recurring one replaces it: it must not be rescheduled once fired
+        if self.recurring.pop(name, None) is not None:
+            self.log_change({"op": "cancel", "name": name})
+
+    def cancel_alarm(self, name):
+        self.recurring.pop(name, None)
+        cancelled = self.alarms.cancel(name)
+        self.alarm_set = bool(self.alarms)
+        if cancelled:
+            self.log_change({"op": "cancel", "name": name})
+        return cancelled
+
+    def start_timer(self, minutes, seconds, hours=0):
+        deadline = self.countdown.start(hours, minutes, seconds)
+        self.timer_set = True
+        # The monotonic deadline does not survive a restart, so the journal keeps the wall-clock one
+        self.log_change({"op": "timer", "deadline": self.wall() + self.countdown.duration,
+                         "duration": self.countdown.duration})
+        return deadline
+
+    def submit_alarm(self, hour, minute):
+        # Values as typed in the entries. Returns the new alarm, or None if they are not valid
+        hour, minute = to_int(hour), to_int(minute)
+        if hour is None or minute is None or not (0 <= hour <= 23 and 0 <= minute <= 59):
+            return None
+        self.cancel_entry()
+        return self.add_alarm(hour, minute)
+
+    def submit_timer(self, minutes, seconds, hours=0):
+        # Values as typed in the entries. Returns the countdown deadline, or None if they are not valid (or zero)
+        hours, minutes, seconds = to_int(hours), to_int(minutes), to_int(seconds)
+        if None in (hours, minutes, seconds) or hours < 0 or not (0 <= minutes <= 59 and 0 <= seconds <= 59):
+            return None
+        if hours == minutes == seconds == 0:
+            return None
+        self.cancel_entry()
+        return self.start_timer(minutes, seconds, hours)
+
+    def cancel_timer(self):
+        cancelled = self.timer_set
+        self.countdown.cancel()
+        self.timer_set = False
+        if cancelled:
+            self.log_change({"op": "timer_cancel"})
+        return cancelled
+
+    def stopwatch_lap(self):
+        if self.stopwatch.running:
+            return self.stopwatch.lap()
+        return None
+
+    def stop_all(self):
+        self.timer_set = False
+        self.countdown.cancel()
+        self.alarm_set = False
+        self.alarms.clear()
+        self.recurring.clear()
+        self.log_change({"op": "clear"})
+
+    # ---- Persistence
+
+    def log_change(self, record):
+        if self.journal is not None:
+            self.journal.record(record)
+
+    def log_event(self, kind, label, latency, now=None):
+        if self.history is not None:
+            self.history.record(kind, label, latency, self.wall() if now is None else now)
+
+    def restore(self, state):
+        # Reloads a schedule saved by the journal. Alarms that came due meanwhile fire on the next tick, and a
+        # countdown keeps its original deadline (it finishes on the next tick if that has passed)
+        journal, self.journal = self.journal, None
+        try:
+            for name, (fire_at, label) in state["alarms"].items():
+                if math.isfinite(fire_at):     # Journals written before values were range-checked may hold inf/NaN
+                    self.alarms.add(name, fire_at, label)
+            for name, (rule, label) in state.get("recurring", {}).items():
+                try:
+                    self.add_recurring(name, rule, label)
+                except ValueError:
+                    pass
+            self.alarm_set = bool(self.alarms)
+            if state.get("timer") and all(math.isfinite(value or 0) for value in state["timer"]):
+                deadline, duration = state["timer"]
+                self.countdown.start(seconds=max(deadline - self.wall(), 0))
+                if duration:
+                    self.countdown.duration = duration
+                self.timer_set = True
+        finally:
+            self.journal = journal
+
+    # ---- Key handling
+
+    def on_key(self, keysym):
+        # Returns what the view has to do: "quit", "alarm_entry", "timer_entry", "cancel_alarm_entry",
+        # "cancel_timer_entry", "stop", "submit_alarm", "submit_timer", "redraw" or None
+        if keysym == "Escape":                  # Escape --> QUIT
+            if self.clock_mode:
+                return "quit"
+            mode = self.cancel_entry()
+            return "cancel_%s_entry" % mode if mode else None
+
+        elif keysym in ("a", "A"):              # a, A --> Alarm mode
+            if self.begin_entry("alarm"):
+                return "alarm_entry"
+
+        elif keysym in ("t", "T"):              # t, T --> Timer mode
+            if self.begin_entry("timer"):
+                return "timer_entry"
+
+        elif keysym in ("w", "W"):              # w, W --> Start / pause stopwatch
+            if self.clock_mode:
+                self.stopwatch.toggle()
+                return "redraw"
+
+        elif keysym in ("l", "L"):              # l, L --> Stopwatch lap
+            if self.clock_mode and self.stopwatch_lap() is not None:
+                return "redraw"
+
+        elif keysym in ("s", "S"):              # s, S --> Reset stopwatch if shown, else STOP Countdown / Alarms
+            if self.clock_mode and self.stopwatch.active:
+                self.stopwatch.reset()
+                return "redraw"
+            if self.clock_mode:
+                self.stop_all()
+                return "stop"
+
+        elif keysym == "Return":                # Return --> Gather Countdown / Alarm values
+            if self.entry_mode:
+                return "submit_%s" % self.entry_mode
+
+        return None
+
+    # ---- Entry validation
+
+    def validate_hour(self, new_value):
+        return self.clock_mode or valid_field(new_value, 23)
+
+    def validate_min_sec(self, new_value):
+        return self.clock_mode or valid_field(new_value, 59)
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def valid_field(new_value, maximum):
+    # Whether `new_value` may be typed into a 2-digit entry holding 0..maximum (empty is allowed while typing)
+    if not new_value.strip():
+        return True
+    if len(new_value) > 2:
+        return False
+    value = to_int(new_value)
+    return value is not None and 0 <= value <= maximum
@@ -0,0 +1,117 @@
+import collections
+import queue
+import threading
+import time
+import utils
+
+
+class Notifier:
+    # One long-lived thread that shows desktop notifications (and plays their sound) for the whole process.
+    # Messages arriving within `coalesce` seconds of each other are merged into a single summary popup, popups are
+    # at least `min_interval` seconds apart, and the queue is bounded so a burst can never pile up threads or sounds.
+    # Enqueue-to-displayed latency is recorded for every message.
+    # If `play` is given (e.g. audio.AudioPlayer.play), the sound is handed to it instead of `show`
+
+    shared = None
+
+    @classmethod
+    def get(cls, sound, icon, **kwargs):
+        # The notifier of the process, shared by all the clock windows (the arguments only count the first time)
+        if cls.shared is None:
+            cls.shared = cls(sound, icon, **kwargs)
+        return cls.shared
+
+    def __init__(self, sound, icon, *, show=utils.notify, play=None, maxsize=100, coalesce=0.5, min_interval=1.0,
+                 history=1000):
+        self.sound = sound
+        self.icon = icon
+        self.show = show
+        self.play = play
+        self.coalesce = coalesce
+        self.min_interval = min_interval
+        self.queue = queue.Queue(maxsize)
+        self.latencies = collections.deque(maxlen=history)   # (message, seconds) for the latest messages
+        self.dropped = 0
+        self.displayed = 0
+        self.popups = 0
+        self.last_popup = None
+        self.thread = threading.Thread(target=self.run, name="Notifier", daemon=True)
+        self.thread.start()
+
+    def notify(self, message):
+        # Never blocks the caller (the Tk thread). Returns False if the message was dropped because the queue is full
+        try:
+            self.queue.put_nowait((time.monotonic(), message))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout=None):
+        if Notifier.shared is self:
+            Notifier.shared = None
+        self.queue.put((None, None))
+        self.thread.join(timeout)
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            if batch[0][1] is None:
+                return
+
+            # Rate limit: wait for the next allowed popup, and gather whatever arrives meanwhile
+            deadline = time.monotonic() + self.coalesce
+            if self.last_popup is not None:
+                deadline = max(deadline, self.last_popup + self.min_interval)
+            closing = False
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item[1] is None:
+                    closing = True
+                    break
+                batch.append(item)
+
+            self.display(batch)
+            if closing:
+                return
+
+    def display(self, batch):
+        if len(batch) == 1:
+            message = batch[0][1]
+        else:
+            message = "%d notifications:\n%s" % (len(batch), "\n".join(item[1] for item in batch))
+        # Popup first and sound afterwards (playing it blocks), so latency measures when the message was shown
+        # A broken notification backend must not kill the dispatcher
+        try:
+            self.show(message, None, self.icon)
+        except Exception:
+            pass
+        now = time.monotonic()
+        self.last_popup = now
+        self.popups += 1
+        self.displayed += len(batch)
+        for queued_at, text in batch:
+            self.latencies.append((text, now - queued_at))
+
+        try:
+            if self.play is not None:
+                self.play(self.sound)
+            else:
+                self.show(None, self.sound, None)
+        except Exception:
+            pass
+
+    def latency_stats(self):
+        values = sorted(latency for _, latency in self.latencies)
+        if not values:
+            return {"count": 0}
+        return {"count": len(values),
+                "p50": values[len(values) // 2],
+                "p99": values[min(len(values) - 1, int(len(values) * 0.99))],
+                "max": values[-1]}
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Recurring alarm rules, compiled into bit masks so the next occurrence is found field by field (month, day, hour,
+minute) instead of scanning minute by minute. Times are local, like the one-shot alarms.
+
+Rules:
+daily 07:30
+weekdays 09:00                 (Monday to Friday; also "weekends")
+mon,wed,fri 18:15              (day names, lists and ranges such as mon-thu)
+*/15 9-17 * * 1-5              (cron: minute hour day-of-month month day-of-week, Sunday is 0 or 7)
+
+*** USAGE:
+python3 recurrence.py "weekdays 09:00" [COUNT]      (print the next COUNT occurrences, 10 by default)
+"""
+
+import calendar
+import functools
+import sys
+import time
+
+DAY_NAMES = ["sun", "mon", "tue", "wed", "thu", "fri", "sat"]
+MONTH_NAMES = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+SHORTCUTS = {"daily": "*", "weekdays": "1-5", "weekends": "0,6"}
+MAX_YEARS = 8   # A rule without an occurrence in this span (e.g. February 30th) never fires
+
+
+def next_bit(mask, start):
+    # Lowest set bit of `mask` at position >= start, or None
+    rest = mask >> start
+    if not rest:
+        return None
+    return start + (rest & -rest).bit_length() - 1
+
+
+@functools.lru_cache(maxsize=1024)
+def month_info(year, month):
+    # (weekday of the 1st with Monday = 0, number of days)
+    return calendar.monthrange(year, month)
+
+
+def parse_field(text, lo, hi, names=None):
+    # One cron field ("*", "5", "1-5", "*/15", "mon-fri", "1,15,30"...) as a bit mask of the values it allows
+    mask = 0
+    for item in text.lower().split(","):
+        item, _, step = item.partition("/")
+        step = int(step) if step else 1
+        if step < 1:
+            raise ValueError("bad step in %r" % text)
+        if item == "*":
+            first, last = lo, hi
+        else:
+            first, _, last = item.partition("-")
+            first = parse_value(first, names, lo)
+            last = parse_value(last, names, lo) if last else (hi if step > 1 else first)
+        if not (lo <= first <= hi and lo <= last <= hi) or first > last:
+            raise ValueError("value out of range in %r" % text)
+        for value in range(first, last + 1, step):
+            mask |= 1 << value
+    return mask
+
+
+def parse_value(text, names, lo):
+    if names and text[:3] in names:
+        return names.index(text[:3]) + lo
+    return int(text)
+
+
+class Recurrence:
+    # A compiled rule: one bit mask per field (bit n set when value n is allowed)
+
+    __slots__ = ("text", "minutes", "hours", "days", "months", "weekdays", "any_day", "any_weekday", "weekday_days")
+
+    def __init__(self, text, minutes, hours, days, months, weekdays, any_day, any_weekday):
+        self.text = text
+        self.minutes = minutes
+        self.hours = hours
+        self.days = days
+        self.months = months
+        self.weekdays = weekdays        # Bit 0 is Monday (as in time.struct_time)
+        self.any_day = any_day
+        self.any_weekday = any_weekday
+        # Days of a month allowed by the weekday field, for each possible weekday of the 1st
+        self.weekday_days = tuple(sum(1 << day for day in range(1, 32) if weekdays >> ((first + day - 1) % 7) & 1)
+                                  for first in range(7))
+
+    def __repr__(self):
+        return "Recurrence(%r)" % self.text
+
+    def day_mask(self, year, month):
+        first, length = month_info(year, month)
+        if self.any_day and self.any_weekday:
+            mask = self.days
+        elif self.any_day:
+            mask = self.weekday_days[first]
+        elif self.any_weekday:
+            mask = self.days
+        else:
+            mask = self.days | self.weekday_days[first]     # Like cron: either field may match
+        return mask & ((1 << (length + 1)) - 2)
+
+    def next_after(self, t):
+        # Epoch time of the first occurrence strictly after `t`, or None if there is none in MAX_YEARS
+        local = time.localtime(t)
+        year, month, day, hour, minute = local.tm_year, local.tm_mon, local.tm_mday, local.tm_hour, local.tm_min + 1
+        last_year = year + MAX_YEARS
+        while year <= last_year:
+            found = next_bit(self.months, month)
+            if found is None:
+                year, month, day, hour, minute = year + 1, 1, 1, 0, 0
+                continue
+            if found != month:
+                month, day, hour, minute = found, 1, 0, 0
+            found = next_bit(self.day_mask(year, month), day)
+            if found is None:
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+                day, hour, minute = 1, 0, 0
+                continue
+            if found != day:
+                day, hour, minute = found, 0, 0
+            found = next_bit(self.hours, hour)
+            if found is None:
+                day, hour, minute = day + 1, 0, 0
+                continue
+            if found != hour:
+                hour, minute = found, 0
+            found = next_bit(self.minutes, minute)
+            if found is None:
+                hour, minute = hour + 1, 0
+                continue
+            result = time.mktime((year, month, day, hour, found, 0, 0, 0, -1))
+            if result > t:
+                return result
+            minute = found + 1      # Repeated local time (end of DST) already passed
+        return None
+
+    def occurrences(self, start, end):
+        # Every occurrence in (start, end]
+        t = self.next_after(start)
+        while t is not None and t <= end:
+            yield t
+            t = self.next_after(t)
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_rule(text):
+    # Parses a rule (see the module docstring) into a Recurrence. Raises ValueError if it is not valid
+    fields = text.split()
+    if len(fields) == 2:
+        days = fields[0].lower()
+        hour, sep, minute = fields[1].partition(":")
+        if not sep:
+            raise ValueError("expected HH:MM in %r" % text)
+        fields = [minute, hour, "*", "*", SHORTCUTS.get(days, days)]
+    if len(fields) != 5:
+        raise ValueError("not a recurrence rule: %r" % text)
+    minute, hour, day, month, weekday = ("*" if field == "?" else field for field in fields)
+    weekdays = parse_field(weekday, 0, 7, DAY_NAMES)
+    if weekdays & 1 << 7:
+        weekdays = (weekdays & 0x7f) | 1    # 7 is Sunday too
+    return Recurrence(text, parse_field(minute, 0, 59), parse_field(hour, 0, 23), parse_field(day, 1, 31),
+                      parse_field(month, 1, 12, MONTH_NAMES),
+                      (weekdays >> 1) | ((weekdays & 1) << 6),     # Sunday-first (cron) to Monday-first
+                      day == "*", weekday == "*")
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        return 1
+    rule = compile_rule(sys.argv[1])
+    t = time.time()
+    for _ in range(int(sys.argv[2]) if len(sys.argv) > 2 else 10):
+        t = rule.next_after(t)
+        if t is None:
+            break
+        print(time.strftime("%a %Y-%m-%d %H:%M", time.localtime(t)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
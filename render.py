@@ -0,0 +1,169 @@
+class TclCallCounter:
+    # Counts the Tcl round trips issued by the render layer, per tick and in total.
+    # `all_windows` aggregates every counter in the process, to compare totals across many clock windows
+
+    all_windows = None
+
+    def __init__(self, aggregate=True):
+        self.total = 0
+        self.ticks = 0
+        self.current = 0
+        self.last_tick = 0
+        self.aggregate = aggregate
+
+    def add(self, calls=1):
+        self.total += calls
+        self.current += calls
+        if self.aggregate and TclCallCounter.all_windows is not None:
+            TclCallCounter.all_windows.add(calls)
+
+    def end_tick(self):
+        self.ticks += 1
+        self.last_tick = self.current
+        self.current = 0
+        if self.aggregate and TclCallCounter.all_windows is not None:
+            TclCallCounter.all_windows.end_tick()
+
+    def per_tick(self):
+        return self.total / self.ticks if self.ticks else 0.0
+
+
+TclCallCounter.all_windows = TclCallCounter(aggregate=False)
+
+
+class WidgetView:
+    # Remembers the last text, visibility and tooltip rendered for a widget, and only talks to Tk when they change.
+    # Anything that modifies the widget behind the view's back must go through it too (or call invalidate())
+
+    def __init__(self, widget, counter, tooltip=None, **grid_options):
+        self.widget = widget
+        self.counter = counter
+        self.tooltip = tooltip
+        self.grid_options = grid_options
+        self.text = None
+        self.visible = None
+        self.tooltip_text = None
+
+    def invalidate(self):
+        self.text = None
+        self.visible = None
+        self.tooltip_text = None
+
+    def set_text(self, text):
+        if text != self.text:
+            self.widget.configure(text=text)
+            self.counter.add()
+            self.text = text
+
+    def show(self, visible=True):
+        if visible != self.visible:
+            if visible:
+                self.widget.grid(**self.grid_options)
+            else:
+                self.widget.grid_remove()
+            self.counter.add()
+            self.visible = visible
+
+    def hide(self):
+        self.show(False)
+
+    def set_tooltip(self, text):
+        # Tooltip text lives on the Python side, so this never reaches Tcl; it just avoids rebuilding it
+        if text != self.tooltip_text:
+            self.tooltip.text = text
+            self.tooltip_text = text
+
+
+class GlyphAtlas:
+    # The clock characters (0-9 and ':', plus anything else on first use) rasterised once per font, size and colours
+    # into PhotoImages, so drawing the time is just swapping images. Digits share one cell width, so the layout
+    # never moves. get() returns None if PIL or the font file are not available
+
+    atlases = {}
+    characters = "0123456789:."
+
+    @classmethod
+    def get(cls, master, font_path, size, fg, bg):
+        key = (master._root(), font_path, size, fg, bg)
+        if key not in cls.atlases:
+            try:
+                cls.atlases[key] = cls(master, font_path, size, fg, bg)
+            except (ImportError, OSError, ValueError):
+                cls.atlases[key] = None
+        return cls.atlases[key]
+
+    def __init__(self, master, font_path, size, fg, bg):
+        from PIL import ImageFont
+        self.master = master
+        self.font = ImageFont.truetype(font_path, size)
+        self.fg = master.winfo_rgb(fg)
+        self.bg = master.winfo_rgb(bg)
+        ascent, descent = self.font.getmetrics()
+        self.height = ascent + descent
+        self.digit_width = max(int(round(self.font.getlength(digit))) for digit in "0123456789")
+        self.images = {}
+        self.widths = {}
+        for ch in self.characters:
+            self.image(ch)
+
+    def image(self, ch):
+        image = self.images.get(ch)
+        if image is None:
+            from PIL import Image, ImageDraw, ImageTk
+            width = self.digit_width if ch.isdigit() else max(int(round(self.font.getlength(ch))), 1)
+            # winfo_rgb() gives 16-bit channels
+            glyph = Image.new("RGB", (width, self.height), tuple(c >> 8 for c in self.bg))
+            ImageDraw.Draw(glyph).text((width // 2, 0), ch, font=self.font, anchor="ma",
+                                       fill=tuple(c >> 8 for c in self.fg))
+            image = self.images[ch] = ImageTk.PhotoImage(glyph, master=self.master)
+            self.widths[ch] = width
+        return image
+
+    def width(self, text):
+        for ch in text:
+            self.image(ch)
+        return sum(self.widths[ch] for ch in text)
+
+
+class GlyphView(WidgetView):
+    # Draws text on a Canvas with the images of a GlyphAtlas, only touching the characters that changed
+
+    def __init__(self, canvas, atlas, counter, tooltip=None, **grid_options):
+        WidgetView.__init__(self, canvas, counter, tooltip, **grid_options)
+        self.atlas = atlas
+        self.items = []
+        self.chars = ""
+
+    def invalidate(self):
+        WidgetView.invalidate(self)
+        self.chars = ""
+
+    def layout(self, text):
+        # Positions change only when the text shape does (e.g. another length or a '.' appears)
+        canvas = self.widget
+        if self.items:
+            canvas.delete(*self.items)      # One call for all the old items
+            self.counter.add()
+        self.items = []
+        x = 0
+        for ch in text:
+            self.items.append(canvas.create_image(x, 0, image=self.atlas.image(ch), anchor="nw"))
+            x += self.atlas.widths[ch]
+        canvas.configure(width=x, height=self.atlas.height)
+        self.counter.add(len(text) + 1)
+        self.chars = text
+
+    def set_text(self, text):
+        if text == self.text:
+            return
+        if len(text) != len(self.chars) or \
+                any(self.atlas.widths.get(a) != self.atlas.widths.get(b) for a, b in zip(text, self.chars)):
+            self.layout(text)
+        else:
+            canvas = self.widget
+            for item, new, old in zip(self.items, text, self.chars):
+                if new != old:
+                    canvas.itemconfigure(item, image=self.atlas.image(new))
+                    self.counter.add()
+            self.chars = text
+        self.text = text
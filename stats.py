@@ -0,0 +1,212 @@
+import array
+import bisect
+import os
+import time
+import utils
+
+
+class Histogram:
+    # Fixed, exponentially spaced buckets (in seconds), so recording is O(log buckets) and memory never grows
+
+    def __init__(self, lowest=0.0001, highest=10.0, per_decade=20):
+        edges = []
+        edge = lowest
+        factor = 10 ** (1.0 / per_decade)
+        while edge < highest:
+            edges.append(edge)
+            edge *= factor
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.edges, value)] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, pct):
+        # Upper edge of the bucket holding the given percentile (capped by the largest value seen)
+        if not self.count:
+            return 0.0
+        rank = pct / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(self.edges[i] if i < len(self.edges) else self.max, self.max)
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "p50": self.percentile(50), "p99": self.percentile(99), "max": self.max}
+
+
+class TickStats:
+    # Scheduled vs. actual fire time of every tick (the latest `size` ticks, in a fixed-size ring buffer),
+    # plus histograms of tick jitter (lateness) and render duration since startup
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.scheduled = array.array("d", bytes(8 * size))
+        self.actual = array.array("d", bytes(8 * size))
+        self.render = array.array("d", bytes(8 * size))
+        self.next = 0
+        self.total = 0
+        self.jitter_hist = Histogram()
+        self.render_hist = Histogram()
+        self.pacer = None       # timekeeping.FramePacer whose frame stats are included in the summary
+        self.wakeups = None     # timekeeping.WakeupCounter of the timer-driven ticks, same
+
+    def record(self, scheduled, actual, render):
+        i = self.next
+        self.scheduled[i] = scheduled
+        self.actual[i] = actual
+        self.render[i] = render
+        self.next = (i + 1) % self.size
+        self.total += 1
+        self.jitter_hist.add(max(actual - scheduled, 0.0))
+        self.render_hist.add(render)
+
+    def recent(self):
+        # (scheduled, actual, render) of the buffered ticks, oldest first
+        count = min(self.total, self.size)
+        start = (self.next - count) % self.size
+        return [(self.scheduled[(start + i) % self.size], self.actual[(start + i) % self.size],
+                 self.render[(start + i) % self.size]) for i in range(count)]
+
+    def summary(self):
+        summary = {"ticks": self.total,
+                   "jitter": self.jitter_hist.summary(),
+                   "render": self.render_hist.summary()}
+        if self.pacer is not None:
+            summary["frames"] = self.pacer.summary()
+        if self.wakeups is not None:
+            summary["wakeups"] = {"total": self.wakeups.total, "per_minute": self.wakeups.per_minute()}
+        return summary
+
+
+class StatsExporter:
+    # Opt-in export of TickStats: a JSON file rewritten atomically and/or a local UNIX socket that answers
+    # every connection with the same JSON document. One per process (see get()), fed by every clock window:
+    # the top-level fields are those of the first window, and "windows" lists them all.
+    # flush() rewrites the file; attach() makes a Tk widget call it periodically and answer connections as they come
+
+    shared = None
+
+    @classmethod
+    def get(cls):
+        # The exporter of the process, created on first use. None unless CLOCK_STATS_FILE and/or
+        # CLOCK_STATS_SOCKET are set
+        if cls.shared is None:
+            path = os.environ.get("CLOCK_STATS_FILE")
+            socket_path = os.environ.get("CLOCK_STATS_SOCKET")
+            if not path and not socket_path:
+                return None
+            try:
+                cls.shared = cls(None, path, socket_path)
+            except OSError:
+                # E.g. CLOCK_STATS_SOCKET names a regular file or a live socket: only the file is written
+                if not path:
+                    return None
+                cls.shared = cls(None, path)
+        return cls.shared
+
+    def __init__(self, stats=None, path=None, socket_path=None, name=None):
+        self.sources = [] if stats is None else [stats]
+        self.path = path
+        self.name = name or "clock-%d" % os.getpid()
+        self.server = None
+        self.widget = None
+        # socket and json are only imported once an export is enabled: this module is loaded at every startup
+        import socket
+        if socket_path and hasattr(socket, "AF_UNIX"):
+            utils.remove_stale_socket(socket_path)
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server.bind(socket_path)
+            self.server.listen(4)
+            self.server.setblocking(False)
+            self.socket_path = socket_path
+
+    def add(self, stats):
+        self.sources.append(stats)
+
+    def remove(self, stats):
+        if stats in self.sources:
+            self.sources.remove(stats)
+
+    def document(self):
+        import json
+        windows = [stats.summary() for stats in self.sources]
+        doc = dict(windows[0]) if windows else {}
+        doc["windows"] = windows
+        doc["name"] = self.name
+        doc["time"] = time.time()
+        return json.dumps(doc)
+
+    def flush(self):
+        if self.path:
+            tmp = self.path + ".tmp"
+            try:
+                with open(tmp, "w") as f:
+                    f.write(self.document())
+                os.replace(tmp, self.path)
+            except OSError:
+                pass
+        self.answer()
+
+    def answer(self):
+        # Sends the document to every pending connection. It fits in an empty socket buffer, so nothing blocks:
+        # a client that is not reading just gets it cut short
+        if self.server is None:
+            return
+        doc = None
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            if doc is None:
+                doc = self.document().encode() + b"\n"
+            try:
+                conn.setblocking(False)
+                conn.send(doc)
+            except OSError:
+                pass
+            conn.close()
+
+    # ---- Tk integration
+
+    def attach(self, widget, interval=10000):
+        # Rewrites the file every `interval` milliseconds, and answers connections as soon as they arrive
+        self.widget = widget
+        if self.server is not None and hasattr(widget.tk, "createfilehandler"):
+            import tkinter
+            widget.tk.createfilehandler(self.server, tkinter.READABLE, lambda *args: self.answer())
+        self.tick(interval)
+
+    def tick(self, interval):
+        if self.widget is not None:
+            self.flush()
+            self.job = self.widget.after(interval, self.tick, interval)
+
+    def close(self):
+        if StatsExporter.shared is self:
+            StatsExporter.shared = None
+        if self.widget is not None:
+            self.widget.after_cancel(self.job)
+            if self.server is not None and hasattr(self.widget.tk, "deletefilehandler"):
+                self.widget.tk.deletefilehandler(self.server)
+            self.widget = None
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+            try:
+                utils.remove_stale_socket(self.socket_path)
+            except OSError:
+                pass
+        if self.path:
+            try:
+                os.remove(self.path)    # Only describes a running process
+            except OSError:
+                pass
@@ -0,0 +1,492 @@
+import array
+import collections
+import heapq
+import math
+import stats
+import time
+
+
+MAX_TIME = 253402300799     # Epoch seconds of 9999-12-31 23:59:59 UTC, the last time that can be displayed
+
+
+def valid_time(t):
+    # Whether `t` is an epoch time an alarm can be set at (finite, and one that localtime() can format)
+    return math.isfinite(t) and 0 <= t <= MAX_TIME
+
+
+def split_seconds(total):
+    # Returns (hours, minutes, seconds) for a number of seconds. Seconds keep their fractional part
+    hours, rest = divmod(max(total, 0), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return int(hours), int(minutes), seconds
+
+
+def format_seconds(total, precision=0):
+    # Formats a number of seconds as HH:MM:SS (or HH:MM:SS.f... if precision > 0)
+    # Whole seconds are rounded up, so a countdown shows 00:00:00 only once it has actually finished
+    total = max(total, 0)
+    if precision > 0:
+        scale = 10 ** precision
+        units = math.ceil(round(total * scale, 6))
+        hours, minutes, seconds = split_seconds(units // scale)
+        return "%02d:%02d:%02d.%0*d" % (hours, minutes, seconds, precision, units % scale)
+    hours, minutes, seconds = split_seconds(math.ceil(round(total, 6)))
+    return "%02d:%02d:%02d" % (hours, minutes, seconds)
+
+
+if hasattr(time, "CLOCK_BOOTTIME"):
+    def uptime():
+        # Monotonic seconds that keep counting while the machine is suspended (CLOCK_MONOTONIC stops on Linux)
+        return time.clock_gettime(time.CLOCK_BOOTTIME)
+else:
+    uptime = time.monotonic     # Already counts suspended time on Windows
+
+
+class Countdown:
+    # Countdown timer based on an absolute monotonic deadline.
+    # Remaining time is always computed from the deadline, so late, merged or skipped ticks never make it drift
+
+    def __init__(self, clock=uptime):
+        self.clock = clock
+        self.duration = 0.0
+        self.deadline = None
+
+    @property
+    def running(self):
+        return self.deadline is not None
+
+    def start(self, hours=0, minutes=0, seconds=0.0):
+        self.duration = float(hours) * 3600 + float(minutes) * 60 + float(seconds)
+        self.deadline = self.clock() + self.duration
+        return self.deadline
+
+    def cancel(self):
+        self.deadline = None
+
+    def remaining(self, now=None):
+        if self.deadline is None:
+            return 0.0
+        if now is None:
+            now = self.clock()
+        return max(self.deadline - now, 0.0)
+
+    def expired(self, now=None):
+        return self.deadline is not None and self.remaining(now) <= 0
+
+    def next_change(self, now=None, precision=0):
+        # Seconds until the displayed value changes (i.e. until remaining time crosses the next display unit)
+        remaining = self.remaining(now)
+        step = 10 ** -precision
+        delay = remaining % step
+        return delay if delay > 0 else step
+
+    def format(self, now=None, precision=0):
+        return format_seconds(self.remaining(now), precision)
+
+    def describe(self):
+        # Text for the initial duration, as the user entered it
+        hours, minutes, seconds = split_seconds(self.duration)
+        if hours:
+            return "%d:%02d:%02d" % (hours, minutes, seconds)
+        return "%d:%02d" % (minutes, seconds)
+
+
+def next_wall_time(hour, minute, second=0, now=None):
+    # Absolute (epoch) time of the next local HH:MM:SS after `now`. If that time has passed today, it is tomorrow's
+    if now is None:
+        now = time.time()
+    lt = time.localtime(now)
+    target = time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday, hour, minute, second, 0, 0, -1))
+    day = 1
+    while target <= now:
+        # mktime normalizes the day overflow, and -1 lets it pick the right DST flag for the new date
+        target = time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday + day, hour, minute, second, 0, 0, -1))
+        day += 1
+    return target
+
+
+class Alarm:
+    __slots__ = ("name", "fire_at", "label", "seq", "cancelled")
+
+    def __init__(self, name, fire_at, label, seq):
+        self.name = name
+        self.fire_at = fire_at
+        self.label = label
+        self.seq = seq
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.fire_at, self.seq) < (other.fire_at, other.seq)
+
+    def __repr__(self):
+        return "Alarm(%r, %s)" % (self.name, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.fire_at)))
+
+
+class AlarmSchedule:
+    # Named alarms indexed by a heap keyed on absolute (epoch) fire time.
+    # A tick only looks at the head, so its cost does not depend on how many alarms are scheduled.
+    # Cancelled or replaced alarms are flagged and dropped lazily when they reach the head
+
+    def __init__(self):
+        self.heap = []
+        self.by_name = {}
+        self.seq = 0
+        self.stale = 0
+        self.version = 0    # Bumped on every change, so views can tell when they need to refresh
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __iter__(self):
+        # Pending alarms in firing order
+        return iter(sorted(self.by_name.values()))
+
+    def get(self, name):
+        return self.by_name.get(name)
+
+    def upcoming(self, limit):
+        return heapq.nsmallest(limit, self.by_name.values())
+
+    def add(self, name, fire_at, label=None):
+        # Adding an alarm with an existing name replaces it
+        self.cancel(name)
+        self.seq += 1
+        alarm = Alarm(name, fire_at, name if label is None else label, self.seq)
+        self.by_name[name] = alarm
+        heapq.heappush(self.heap, alarm)
+        self.version += 1
+        return alarm
+
+    def add_many(self, items):
+        # Bulk insert of (name, fire_at, label) items: one heapify instead of a push per alarm when that is cheaper
+        items = list(items)
+        if len(items) < len(self.heap) // 4:
+            for name, fire_at, label in items:
+                self.add(name, fire_at, label)
+            return len(items)
+        for name, fire_at, label in items:
+            self.cancel(name)
+            self.seq += 1
+            alarm = Alarm(name, fire_at, name if label is None else label, self.seq)
+            self.by_name[name] = alarm
+            self.heap.append(alarm)
+        heapq.heapify(self.heap)
+        self.version += 1
+        return len(items)
+
+    def cancel(self, name):
+        alarm = self.by_name.pop(name, None)
+        if alarm is None:
+            return False
+        alarm.cancelled = True
+        self.stale += 1
+        self.version += 1
+        if self.stale > 64 and self.stale > len(self.heap) // 2:
+            self.compact()
+        return True
+
+    def clear(self):
+        self.heap = []
+        self.by_name = {}
+        self.stale = 0
+        self.version += 1
+
+    def compact(self):
+        self.heap = [alarm for alarm in self.heap if not alarm.cancelled]
+        heapq.heapify(self.heap)
+        self.stale = 0
+
+    def peek(self):
+        heap = self.heap
+        while heap and heap[0].cancelled:
+            heapq.heappop(heap)
+            self.stale -= 1
+        return heap[0] if heap else None
+
+    def next_due(self):
+        alarm = self.peek()
+        return alarm.fire_at if alarm else None
+
+    def due(self, now=None):
+        # Pops and returns every alarm whose fire time has been reached, even if its exact second was missed
+        if now is None:
+            now = time.time()
+        fired = []
+        alarm = self.peek()
+        while alarm is not None and alarm.fire_at <= now:
+            heapq.heappop(self.heap)
+            del self.by_name[alarm.name]
+            fired.append(alarm)
+            self.version += 1
+            alarm = self.peek()
+        return fired
+
+
+class WakeupCounter:
+    # Counts wakeups (scheduled callbacks that actually ran) over a sliding one-minute window
+
+    def __init__(self, clock=time.monotonic, window=60.0):
+        self.clock = clock
+        self.window = window
+        self.stamps = collections.deque()
+        self.total = 0
+
+    def add(self):
+        now = self.clock()
+        self.stamps.append(now)
+        self.total += 1
+        self.expire(now)
+
+    def expire(self, now):
+        limit = now - self.window
+        stamps = self.stamps
+        while stamps and stamps[0] <= limit:
+            stamps.popleft()
+
+    def per_minute(self):
+        self.expire(self.clock())
+        return len(self.stamps) * 60.0 / self.window
+
+
+class ClockWatchdog:
+    # Detects wall-clock steps (NTP corrections, manual changes, time zone fixes) by comparing how far the wall clock
+    # and the monotonic clock moved since the previous check. A suspend is not a step: both clocks keep counting
+    # through it (see uptime()), but the wakeup that follows is late, so alarms may be overdue either way
+
+    def __init__(self, wall=time.time, clock=uptime, tolerance=1.0):
+        self.wall = wall
+        self.clock = clock
+        self.tolerance = tolerance  # Seconds of disagreement taken as scheduling noise
+        self.last = None            # (wall, monotonic) at the previous check
+        self.steps = 0
+        self.last_step = 0.0
+
+    def check(self, wall=None):
+        # Returns how many seconds the wall clock jumped since the previous check (0.0 if it did not)
+        if wall is None:
+            wall = self.wall()
+        clock = self.clock()
+        last, self.last = self.last, (wall, clock)
+        if last is None:
+            return 0.0
+        step = (wall - last[0]) - (clock - last[1])
+        if abs(step) <= self.tolerance:
+            return 0.0
+        self.steps += 1
+        self.last_step = step
+        return step
+
+
+class FramePacer:
+    # Fixed-rate frame clock for sub-second displays. Frames sit on a grid (origin + k / rate), so a late callback
+    # gets a shorter delay instead of pushing every later frame back, and frames the UI thread missed are skipped
+    # instead of queued. frame() is called at the start of every frame and returns the delay until the next one
+
+    RATES = (10, 30, 60)
+
+    def __init__(self, rate=30, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError("frame rate must be positive")
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.clock = clock
+        self.origin = None          # Time of frame 0 of the current run, None while not pacing
+        self.index = 0              # Grid index of the frame that was scheduled last
+        self.last = None
+        self.frames = 0
+        self.skipped = 0
+        self.intervals = stats.Histogram(lowest=0.001, highest=2.0)
+
+    @property
+    def running(self):
+        return self.origin is not None
+
+    def stop(self):
+        self.origin = None
+        self.last = None
+
+    def frame(self, now=None):
+        if now is None:
+            now = self.clock()
+        if self.origin is None:
+            self.origin = now
+            self.index = 0
+        elif self.last is not None:
+            self.intervals.add(now - self.last)
+        self.last = now
+        self.frames += 1
+        # The grid frame nearest to now is the one being drawn (callbacks may also run a bit early)
+        current = int((now - self.origin) / self.period + 0.5)
+        if current > self.index:
+            self.skipped += current - self.index
+        self.index = current + 1
+        return self.origin + self.index * self.period - now
+
+    def summary(self):
+        return {"rate": self.rate, "frames": self.frames, "skipped": self.skipped,
+                "interval": self.intervals.summary()}
+
+
+class ZoneClock:
+    # Wall time of one timezone. Its UTC offset is computed once and cached until the zone's next DST transition,
+    # so rendering a tick is just an addition and a gmtime()
+
+    search_step = 7 * 86400     # Coarse step used to look for the next transition
+    search_span = 400 * 86400   # Zones without a transition in this span are rechecked after it
+
+    def __init__(self, name, label=None):
+        import datetime
+        import zoneinfo
+        self.fromtimestamp = datetime.datetime.fromtimestamp
+        self.name = name
+        self.label = label or name.rsplit("/", 1)[-1].replace("_", " ")
+        self.zone = zoneinfo.ZoneInfo(name)
+        self.offset = 0
+        self.valid_until = float("-inf")
+        self.recomputed = 0
+
+    def utcoffset(self, now):
+        return self.fromtimestamp(now, self.zone).utcoffset().total_seconds()
+
+    def update(self, now):
+        self.offset = self.utcoffset(now)
+        self.valid_until = self.next_transition(now)
+        self.recomputed += 1
+
+    def next_transition(self, now):
+        # First moment after `now` at which the offset changes (to the second), found by a coarse scan and bisection
+        lo = now
+        hi = None
+        t = now
+        while t < now + self.search_span:
+            t += self.search_step
+            if self.utcoffset(t) != self.offset:
+                hi = t
+                break
+            lo = t
+        if hi is None:
+            return lo
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.utcoffset(mid) == self.offset:
+                lo = mid
+            else:
+                hi = mid
+        return hi
+
+    def local(self, now):
+        if now >= self.valid_until:
+            self.update(now)
+        return time.gmtime(now + self.offset)
+
+    def format(self, now, fmt="%H:%M:%S"):
+        return time.strftime(fmt, self.local(now))
+
+
+class WorldClock:
+    # Many timezone clocks rendered from a single time.time() sample per tick
+
+    def __init__(self, zones, clock=time.time):
+        self.clock = clock
+        self.zones = [zone if isinstance(zone, ZoneClock) else ZoneClock(zone) for zone in zones]
+
+    def tick(self, now=None, fmt="%H:%M:%S"):
+        if now is None:
+            now = self.clock()
+        return [zone.format(now, fmt) for zone in self.zones]
+
+    def invalidate(self):
+        # After a wall-clock step backwards the cached offsets may predate a transition: recompute them all
+        for zone in self.zones:
+            zone.valid_until = float("-inf")
+
+
+class Stopwatch:
+    # High-resolution stopwatch (perf_counter_ns). Lap times are kept in a compact array of int64 nanoseconds,
+    # and their statistics are updated as each lap is added, so long sessions stay small and cheap
+
+    def __init__(self, clock=time.perf_counter_ns):
+        self.clock = clock
+        self.started = None         # Clock value when (re)started, while running
+        self.accumulated = 0        # Nanoseconds counted before the last (re)start
+        self.last_lap = 0           # Elapsed time at the last lap
+        self.laps = array.array("q")
+        self.best = None
+        self.worst = None
+        self.total = 0
+
+    @property
+    def running(self):
+        return self.started is not None
+
+    @property
+    def active(self):
+        return self.running or self.accumulated > 0
+
+    def start(self):
+        if self.started is None:
+            self.started = self.clock()
+
+    def stop(self):
+        if self.started is not None:
+            self.accumulated += self.clock() - self.started
+            self.started = None
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def reset(self):
+        self.__init__(self.clock)
+
+    def elapsed_ns(self):
+        if self.started is None:
+            return self.accumulated
+        return self.accumulated + self.clock() - self.started
+
+    def lap(self):
+        # Returns the duration of the lap just finished, in nanoseconds
+        now = self.elapsed_ns()
+        duration = now - self.last_lap
+        self.last_lap = now
+        self.laps.append(duration)
+        self.total += duration
+        if self.best is None or duration < self.best:
+            self.best = duration
+        if self.worst is None or duration > self.worst:
+            self.worst = duration
+        return duration
+
+    @property
+    def mean(self):
+        return self.total / len(self.laps) if self.laps else None
+
+    def format(self, precision=3):
+        return format_elapsed(self.elapsed_ns(), precision)
+
+    def export_csv(self, path):
+        # lap, lap time, total time (seconds, with nanosecond digits)
+        with open(path, "w", newline="") as f:
+            f.write("lap,lap_seconds,total_seconds\n")
+            total = 0
+            for number, duration in enumerate(self.laps, 1):
+                total += duration
+                f.write("%d,%d.%09d,%d.%09d\n" % (number, duration // 10 ** 9, duration % 10 ** 9,
+                                                  total // 10 ** 9, total % 10 ** 9))
+        return len(self.laps)
+
+
+def format_elapsed(ns, precision=3):
+    # Formats elapsed nanoseconds as HH:MM:SS.fff (truncated, as stopwatches do)
+    seconds, fraction = divmod(ns, 10 ** 9)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    text = "%02d:%02d:%02d" % (hours, minutes, seconds)
+    if precision > 0:
+        text += ".%0*d" % (precision, fraction // 10 ** (9 - precision))
+    return text
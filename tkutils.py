@@ -1,5 +1,6 @@
+import io
 import tkinter as tk
-from PIL import ImageTk
+import utils
 
 
 class FakeRoot(tk.Tk):
@@ -12,8 +13,8 @@ class FakeRoot(tk.Tk):
 
         self.title(title)
         self.wm_title(title)
-        img = ImageTk.PhotoImage(file=icon)
-        self.tk.call('wm', 'iconphoto', self._w, img)
+        self.icon = None
+        self.after_idle(self.set_icon, icon)   # PIL is only needed here, so it is loaded after the first paint
 
         self.wait_visibility(self)
         self.configure(bg="black")
@@ -29,6 +30,12 @@ class FakeRoot(tk.Tk):
         self.bind('<Map>', self.on_map)
         self.bind('<Unmap>', self.on_unmap)
 
+    def set_icon(self, icon):
+        from PIL import Image, ImageTk
+        # PIL needs a file object, so the icon is copied out of the bundle once, here
+        self.icon = ImageTk.PhotoImage(Image.open(io.BytesIO(utils.resource_data(icon))))
+        self.tk.call('wm', 'iconphoto', self._w, self.icon)
+
     def on_take_focus(self, e=None):
         self.event_generate("<<TAKEFOCUS>>")
 
@@ -109,16 +116,15 @@ class Tooltip:
             self.widget.after_cancel(id_)
 
     def show(self):
-        def tip_pos_calculator(widget, label,
+        def tip_pos_calculator(widget, size, screen,
                                *,
-                               tip_delta=(10, 5), pad=(5, 3, 5, 3)):
+                               tip_delta=(10, 5)):
 
             w = widget
 
-            s_width, s_height = w.winfo_screenwidth(), w.winfo_screenheight()
+            s_width, s_height = screen
 
-            width, height = (pad[0] + label.winfo_reqwidth() + pad[2],
-                             pad[1] + label.winfo_reqheight() + pad[3])
+            width, height = size
 
             mouse_x, mouse_y = w.winfo_pointerxy()
 
@@ -155,40 +161,160 @@ class Tooltip:
 
             return x1, y1
 
-        bg = self.bg
-        fg = self.fg
-        pad = self.pad
-        widget = self.widget
-
-        # creates a toplevel window
-        self.tw = tk.Toplevel(widget)
+        # All tooltips share one window: showing one just updates its text, colors and position
+        self.tw = TooltipWindow.get(self.widget)
+        size = self.tw.show(self, self.text, self.bg, self.fg, self.pad, self.wraplength)
 
-        # Leaves only the label and removes the app window
-        self.tw.wm_overrideredirect(True)
-        self.tw.attributes('-topmost', True)
-        win = tk.Frame(self.tw,
-                       background=bg,
-                       borderwidth=0)
-        label = tk.Label(win,
-                         text=self.text,
-                         justify=tk.LEFT,
-                         background=bg,
-                         foreground=fg,
-                         relief=tk.SOLID,
-                         borderwidth=0,
-                         highlightthickness=0,
-                         wraplength=self.wraplength)
-        label.grid(padx=(pad[0], pad[2]),
-                   pady=(pad[1], pad[3]),
-                   sticky=tk.NSEW)
-        win.grid()
-
-        x, y = tip_pos_calculator(widget, label)
+        x, y = tip_pos_calculator(self.widget, size, self.tw.screen)
 
-        self.tw.wm_geometry("+%d+%d" % (x, y))
+        self.tw.move(x, y)
 
     def hide(self):
         tw = self.tw
         if tw:
-            tw.destroy()
+            tw.hide(self)
         self.tw = None
+
+
+class TooltipWindow:
+    # The tooltip window shared by all Tooltip instances of a Tk interpreter.
+    # It is created the first time a tooltip shows up and then just withdrawn and shown again, so hovering does
+    # not create and destroy X windows. Requested sizes are measured once per text and options
+
+    windows = {}
+
+    @classmethod
+    def get(cls, widget):
+        root = widget._root()
+        tw = cls.windows.get(root)
+        if tw is None or not tw.exists():
+            tw = cls.windows[root] = cls(root)
+        return tw
+
+    def __init__(self, root):
+        self.root = root
+        self.owner = None
+        self.options = None
+        self.sizes = {}
+        self.screen = (root.winfo_screenwidth(), root.winfo_screenheight())
+
+        # creates a toplevel window
+        self.tw = tk.Toplevel(root)
+        self.tw.withdraw()
+
+        # Leaves only the label and removes the app window
+        self.tw.wm_overrideredirect(True)
+        self.tw.attributes('-topmost', True)
+        self.frame = tk.Frame(self.tw,
+                              borderwidth=0)
+        self.label = tk.Label(self.frame,
+                              justify=tk.LEFT,
+                              relief=tk.SOLID,
+                              borderwidth=0,
+                              highlightthickness=0)
+        self.label.grid(sticky=tk.NSEW)
+        self.frame.grid()
+
+    def exists(self):
+        try:
+            return bool(self.tw.winfo_exists())
+        except tk.TclError:
+            return False
+
+    def show(self, owner, text, bg, fg, pad, wraplength):
+        # Returns the size of the tooltip. Only the options that differ from the last shown tooltip are sent to Tk
+        self.owner = owner
+        options = (text, bg, fg, pad, wraplength)
+        if options != self.options:
+            last = self.options or (None,) * 5
+            if (bg, fg) != last[1:3]:
+                self.frame.configure(background=bg)
+                self.label.configure(background=bg, foreground=fg)
+            if pad != last[3]:
+                self.label.grid_configure(padx=(pad[0], pad[2]), pady=(pad[1], pad[3]))
+            if (text, wraplength) != (last[0], last[4]):
+                self.label.configure(text=text, wraplength=wraplength)
+            self.options = options
+
+        key = options
+        size = self.sizes.get(key)
+        if size is None:
+            if len(self.sizes) >= 256:
+                self.sizes.clear()
+            size = self.sizes[key] = (pad[0] + self.label.winfo_reqwidth() + pad[2],
+                                      pad[1] + self.label.winfo_reqheight() + pad[3])
+        return size
+
+    def move(self, x, y):
+        self.tw.wm_geometry("+%d+%d" % (x, y))
+        self.tw.deiconify()
+
+    def hide(self, owner):
+        # Another tooltip may have taken the window over in the meantime
+        if self.owner is owner:
+            self.tw.withdraw()
+            self.owner = None
+
+
+class MotionCoalescer:
+    # Window dragging without flooding the window manager: <B1-Motion> events only record the latest position,
+    # and the window is moved at most once per display frame (the first move of a burst is applied at once).
+    # `events` vs `moves` counts what came in and how many geometry() calls went out
+
+    def __init__(self, window, frame_ms=1000 // 60, snap=0, on_moved=None):
+        self.window = window
+        self.frame_ms = frame_ms
+        self.snap = snap                # Distance (pixels) at which the window sticks to the screen edges
+        self.on_moved = on_moved        # Called with the final (x, y) when a drag ends
+        self.pending = None
+        self.position = None
+        self.job = None
+        self.events = 0
+        self.moves = 0
+
+    def motion(self, x, y):
+        self.events += 1
+        self.pending = (x, y)
+        if self.job is None:
+            self.apply()
+
+    def apply(self):
+        self.job = None
+        if self.pending is None:
+            return
+        x, y = self.pending
+        self.pending = None
+        if self.snap:
+            window = self.window
+            x, y = snap_to_edges(x, y, window.winfo_width(), window.winfo_height(),
+                                 window.winfo_screenwidth(), window.winfo_screenheight(), self.snap)
+        if (x, y) != self.position:
+            self.window.geometry("+%d+%d" % (x, y))
+            self.position = (x, y)
+            self.moves += 1
+        # Whatever arrives during this frame waits for the next one
+        self.job = self.window.after(self.frame_ms, self.apply)
+
+    def release(self, e=None):
+        if self.job is not None:
+            self.window.after_cancel(self.job)
+            self.job = None
+        if self.pending is not None:
+            self.apply()
+            self.window.after_cancel(self.job)
+            self.job = None
+        if self.on_moved is not None and self.position is not None:
+            self.on_moved(self.position)
+
+
+def snap_to_edges(x, y, width, height, screen_width, screen_height, distance):
+    # Moves a window at (x, y) flush with any screen edge closer than `distance` pixels
+    if abs(x) < distance:
+        x = 0
+    elif abs(screen_width - (x + width)) < distance:
+        x = screen_width - width
+    if abs(y) < distance:
+        y = 0
+    elif abs(screen_height - (y + height)) < distance:
+        y = screen_height - height
+    return x, y
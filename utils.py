@@ -1,13 +1,14 @@
+import functools
+import json
 import os
 import sys
 import time
 import subprocess
 import traceback
 from unicodedata import normalize
-import plyer
-import playsound
 
 
+@functools.lru_cache(maxsize=None)
 def resource_path(rel_path):
     """ Thanks to: detly < https://stackoverflow.com/questions/4416336/adding-a-program-icon-in-python-gtk/4416367 > """
     dir_of_py_file = os.path.dirname(__file__)
@@ -18,8 +19,40 @@ def resource_path(rel_path):
     return abs_path_to_resource
 
 
+_bundle = False     # Not looked for yet
+
+
+def resource_bundle():
+    # The packed resources (see bundle.py), if resources/resources.bundle exists. Opened once, on first use
+    global _bundle
+    if _bundle is False:
+        import bundle
+        try:
+            _bundle = bundle.Bundle(resource_path("resources/") + bundle.BUNDLE_NAME)
+        except (OSError, ValueError):
+            _bundle = None
+    return _bundle
+
+
+def resource_data(path):
+    """Contents of a resource, given its path under the resources folder (absolute or relative to it).
+    It comes from the bundle as a zero-copy memoryview when there is one holding it, or from the loose file.
+    Consumers that need bytes or a file object (Tk image data, PIL) still copy it."""
+    packed = resource_bundle()
+    if packed is not None:
+        folder = resource_path("resources/")
+        full = os.path.abspath(path.rstrip(os.sep))
+        name = full[len(folder):] if full.startswith(folder) else path
+        if name in packed:
+            return packed.get(name)
+    with open(path.rstrip(os.sep), "rb") as f:
+        return f.read()
+
+
 def notify(message, sound, icon):
+    # plyer and playsound are only imported the first time a notification is actually shown
     if message is not None:
+        import plyer
         plyer.notification.notify(
             title='Clock by alef',
             message=message,
@@ -28,6 +61,7 @@ def notify(message, sound, icon):
         )
 
     if sound is not None:
+        import playsound
         playsound.playsound(sound)
 
 
@@ -55,12 +89,155 @@ def load_font(archOS, fontpath, private=True, enumerable=False):
         numFontsAdded = AddFontResourceEx(byref(pathbuf), flags, 0)
         return bool(numFontsAdded)
     else:
+        return font_info(fontpath)["valid"]
+
+
+def user_cache_dir():
+    if "LOCALAPPDATA" in os.environ:
+        base = os.environ["LOCALAPPDATA"]
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "clock_by_alef")
+
+
+def remove_stale_socket(path):
+    # Removes a UNIX socket left behind by a process that is gone, before binding `path` again. Raises OSError if
+    # a server still answers there, or if it is not a socket at all (nothing else is ever removed)
+    import errno
+    import socket
+    import stat
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError("not a socket, will not replace it: %s" % path)
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    probe.settimeout(1.0)
+    try:
+        probe.connect(path)
+        stale = False
+    except (ConnectionRefusedError, FileNotFoundError):
+        stale = True    # Nobody listening
+    except OSError:
+        stale = False   # E.g. a busy server that did not accept in time
+    finally:
+        probe.close()
+    if not stale:
+        raise OSError(errno.EADDRINUSE, "address in use", path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+FONT_CACHE_FILE = os.path.join(user_cache_dir(), "fonts.json")
+WINDOW_FILE = os.path.join(user_cache_dir(), "window.json")
+_font_cache = None
+
+
+def _font_key(fontpath):
+    if not os.path.isfile(fontpath):
+        fontpath = resource_path(fontpath).rstrip(os.sep)
+    return os.path.abspath(fontpath)
+
+
+def _read_font(fontpath):
+    # The only place fontTools is used, so it is loaded (and the font parsed) only on a cache miss
+    # Returns None if fontTools is missing: that says nothing about the font, so it must not be cached
+    try:
         from fontTools.ttLib import TTFont
+    except ImportError:
+        return None
+    info = {"valid": False, "family": None, "units_per_em": None, "ascent": None, "descent": None}
+    try:
+        font = TTFont(fontpath, lazy=True)
+        info["family"] = font["name"].getDebugName(1)
+        info["units_per_em"] = font["head"].unitsPerEm
+        info["ascent"] = font["hhea"].ascent
+        info["descent"] = font["hhea"].descent
+        info["valid"] = True
+    except Exception:
+        pass
+    return info
+
+
+def _load_font_cache():
+    global _font_cache
+    if _font_cache is None:
         try:
-            TTFont(resource_path(fontpath))
-            return True
-        except:
-            return False
+            with open(FONT_CACHE_FILE) as f:
+                _font_cache = json.load(f)
+        except (OSError, ValueError):
+            _font_cache = {}
+    return _font_cache
+
+
+def _save_font_cache():
+    try:
+        os.makedirs(os.path.dirname(FONT_CACHE_FILE), exist_ok=True)
+        tmp = FONT_CACHE_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(_font_cache, f)
+        os.replace(tmp, FONT_CACHE_FILE)
+    except OSError:
+        pass
+
+
+def load_window_position(default):
+    # Where the clock was left last time, or `default`
+    try:
+        with open(WINDOW_FILE) as f:
+            position = json.load(f)
+        return int(position["x"]), int(position["y"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return default
+
+
+def save_window_position(x, y):
+    try:
+        os.makedirs(os.path.dirname(WINDOW_FILE), exist_ok=True)
+        tmp = WINDOW_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"x": x, "y": y}, f)
+        os.replace(tmp, WINDOW_FILE)
+    except OSError:
+        pass
+
+
+def preload_fonts(fontpaths):
+    '''
+    Returns the metadata of every font in `fontpaths` (validation result, family name and basic metrics),
+    taking it from a persistent cache keyed by path, size and modification time. Only fonts that are new
+    or changed are parsed, and the cache file is rewritten at most once.
+    '''
+    cache = _load_font_cache()
+    result = {}
+    changed = False
+    for fontpath in fontpaths:
+        key = _font_key(fontpath)
+        try:
+            st = os.stat(key)
+            stamp = [st.st_size, st.st_mtime_ns]
+        except OSError:
+            stamp = None
+        entry = cache.get(key)
+        if entry is None or entry.get("stamp") != stamp:
+            entry = _read_font(key) if stamp else {"valid": False}
+            if entry is None:
+                entry = {"valid": False}
+            else:
+                entry["stamp"] = stamp
+                cache[key] = entry
+                changed = True
+        result[fontpath] = entry
+    if changed:
+        _save_font_cache()
+    return result
+
+
+def font_info(fontpath):
+    return preload_fonts([fontpath])[fontpath]
 
 
 def win_run_as_admin(argv=None, debug=False, force_admin=True):
@@ -141,6 +318,68 @@ def subprocess_args(include_stdout=True):
     return ret
 
 
+class TextWrapper:
+    """Wraps text for one font, measuring each word (with its leading space) once.
+    Widths are cached per token and added up as the line grows, instead of re-measuring ever longer prefixes.
+    Assumes widths are additive at spaces, which holds for fonts without kerning across a space."""
+
+    max_cache = 20000
+
+    def __init__(self, font):
+        self.font = font
+        self.widths = {}
+
+    def measure(self, token):
+        width = self.widths.get(token)
+        if width is None:
+            if len(self.widths) >= self.max_cache:
+                self.widths.clear()
+            width = self.widths[token] = self.font.size(token)[0]
+        return width
+
+    def wrap(self, text, width):
+        text_lines = text.replace('\t', '    ').split('\n')
+        if width is None or width == 0:
+            return text_lines
+
+        measure = self.measure
+        wrapped_lines = []
+        for line in text_lines:
+            line = line.rstrip() + ' '
+            if line == ' ':
+                wrapped_lines.append(line)
+                continue
+
+            # Get the leftmost space ignoring leading whitespace. `base` is where the current output line begins
+            base = 0
+            start = len(line) - len(line.lstrip())
+            start = line.index(' ', start)
+            line_width = measure(line[:start])
+            while start + 1 < len(line):
+                # Get the next potential splitting point
+                next = line.index(' ', start + 1)
+                next_width = line_width + measure(line[start:next])
+                if next_width <= width:
+                    start = next
+                    line_width = next_width
+                else:
+                    wrapped_lines.append(line[base:start])
+                    base = start + 1
+                    start = line.index(' ', base)
+                    line_width = measure(line[base:start])
+            line = line[base:-1]
+            if line:
+                wrapped_lines.append(line)
+
+        return wrapped_lines
+
+
+@functools.lru_cache(maxsize=16)
+def _wrapper(font):
+    # Bounded, so fonts that are no longer used (e.g. after resizes) are eventually let go with their widths
+    return TextWrapper(font)
+
+
 def WrapText(text, font, width):
     # ColdrickSotK
     # https://github.com/ColdrickSotK/yamlui/blob/master/yamlui/util.py#L82-L143
@@ -149,34 +388,18 @@ def WrapText(text, font, width):
     :param font: The font the text will be rendered in.
     :param width: The width to wrap to."""
 
-    text_lines = text.replace('\t', '    ').split('\n')
-    if width is None or width == 0:
-        return text_lines
-
-    wrapped_lines = []
-    for line in text_lines:
-        line = line.rstrip() + ' '
-        if line == ' ':
-            wrapped_lines.append(line)
-            continue
-
-        # Get the leftmost space ignoring leading whitespace
-        start = len(line) - len(line.lstrip())
-        start = line.index(' ', start)
-        while start + 1 < len(line):
-            # Get the next potential splitting point
-            next = line.index(' ', start + 1)
-            if font.size(line[:next])[0] <= width:
-                start = next
-            else:
-                wrapped_lines.append(line[:start])
-                line = line[start + 1:]
-                start = line.index(' ')
-        line = line[:-1]
-        if line:
-            wrapped_lines.append(line)
-
-    return wrapped_lines
+    return _wrapper(font).wrap(text, width)
+
+
+def WrapTexts(texts, font, width):
+    """Wrap many texts at once for the same font and width (sharing its measurement cache).
+    :param texts: The texts to be wrapped.
+    :param font: The font the texts will be rendered in.
+    :param width: The width to wrap to.
+    :return: A list with the wrapped lines of each text."""
+
+    wrap = _wrapper(font).wrap
+    return [wrap(text, width) for text in texts]
 
 
 def to_float(s, dec=1):